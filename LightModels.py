@@ -7,6 +7,14 @@ from .resources import *
 from .LightModels_dockwidget import ModelsDockWidget
 from .my_plugin_dialog import MyPluginDialog
 from .gravity_dialog import GravityDialog
+from .gravity_task import GravityTask
+from .layer_snapshot import LayerSource, add_features, snapshot_layer, write_column
+from .symbology import PALETTE, palette_renderer
+from .engine.geometry import convex_hulls, linestring_wkb, point_wkb, polygon_wkb
+from .engine.parallel import make_backend
+from .engine.centers import center_edges, center_hierarchy, center_members, greedy_coloring, nearest_heavier, significance_thresholds
+from .engine.flow_matrix import FlowMatrix
+from .engine.registry import ResultRegistry
 import os.path
 from PyQt5 import QtCore, QtGui, QtWidgets
 from qgis.core import *
@@ -21,13 +29,13 @@ from qgis.PyQt.QtWidgets import QFileDialog
 from qgis.utils import iface
 from abc import ABC, abstractmethod
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import time 
-import matplotlib.pyplot as plt
 import numpy as np
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import csv
 import os
-import math
+import tempfile
+import threading
+import re
 
 
 # реализация плагина
@@ -62,17 +70,34 @@ class Models:
         self.dockwidget = None
         self.diagram_layer = None
 
+        # реестр результатов гравитационной модели: id слоя потребителей -> запуск модели,
+        # запись результатов на диск идет в фоне
+        self.gm_registry = ResultRegistry(os.path.join(self.plugin_dir, 'gm_data'))
+        self.gm_registry.scan()
+        self.gm_writer = ThreadPoolExecutor(max_workers=1)
+        # проверка записи в реестре и замена файла в потоке записи, удаление записи и файла в
+        # основном потоке выполняются под одной блокировкой, иначе файл удаленного слоя может остаться
+        self.gm_lock = threading.Lock()
+        self.gm_task = None
+
         QgsProject.instance().layerRemoved.connect(self.on_layer_removed)
 
 
     def on_layer_removed(self, removed_layer_id):
-        files = os.listdir(self.plugin_dir + '/gm_data')
-        for file in files:
-            if removed_layer_id in file:
-                if removed_layer_id == file[:-4].split('&')[1]:
-                    layer = QgsProject.instance().mapLayer(file.split('&')[0])
+        with self.gm_lock:
+            entries = self.gm_registry.remove_layer(removed_layer_id)
+            for entry in entries:
+                # закрываем отображение файла в память перед удалением
+                entry.flows = None
+                if os.path.exists(entry.path):
+                    os.remove(entry.path)
+        for entry in entries:
+            if removed_layer_id == entry.layer_tc_id:
+                layer = QgsProject.instance().mapLayer(entry.layer_id)
+                try:
                     layer.selectionChanged.disconnect(self.on_selection_changed)
-                os.remove(self.plugin_dir + '/gm_data/' + file)
+                except:
+                    pass
 
 
     # noinspection PyMethodMayBeStatic
@@ -191,6 +216,9 @@ class Models:
                 action)
             self.iface.removeToolBarIcon(action)
         del self.toolbar
+        if self.gm_task is not None:
+            self.gm_task.cancel()
+        self.gm_writer.shutdown()
 
     # --------------------------------------------------------------------------
     """Гравитационная модель"""
@@ -216,26 +244,44 @@ class Models:
     
     def export_file(self, folder):
         layer = self.diagram_layer
-        files = os.listdir(self.plugin_dir + '/gm_data')
-        if layer:
-            for file in files:
-                if layer.id() == file.split('&')[0]:
-                    layer_tc = QgsProject.instance().mapLayer(file.split('&')[1][:-4])
-                    break
-
-        file_name = f'{layer.id()}&{layer_tc.id()}.csv'
-        
-        source_file_path = os.path.join(self.plugin_dir, 'gm_data', file_name)
+        entry = self.gm_registry.get(layer.id())
+
+        file_name = f'{entry.layer_id}&{entry.layer_tc_id}.csv'
 
         destination_file_path = os.path.join(folder, file_name)
 
         try:
-            shutil.copy(source_file_path, destination_file_path)
-            print("File copied successfully.")
+            self.load_gm_result(entry).write_csv(destination_file_path)
+            print("File exported successfully.")
         except Exception as e:
-            print("Error occurred while copying file:", str(e))
+            print("Error occurred while exporting file:", str(e))
     
     
+    def load_gm_result(self, entry):
+        if entry.flows is None:
+            entry.flows = FlowMatrix.load(entry.path)
+        return entry.flows
+
+
+    def write_gm_result(self, entry, flows):
+        # матрица передается при постановке задачи: entry.flows может быть сброшен в
+        # on_layer_removed раньше, чем до записи дойдет очередь
+        # пишем во временный файл, чтобы в gm_data не появлялись недописанные результаты
+        gm_data_dir = os.path.dirname(entry.path)
+        os.makedirs(gm_data_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=gm_data_dir)
+        os.close(fd)
+        try:
+            flows.save(tmp_path)
+            with self.gm_lock:
+                if self.gm_registry.get(entry.layer_id) is entry:
+                    os.replace(tmp_path, entry.path)
+        finally:
+            # слой удален, пока шла запись, или запись не удалась
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
     def run_gravity_dialog(self):
         self.dlg_model = GravityDialog()
         for layer in iface.mapCanvas().layers():
@@ -250,31 +296,16 @@ class Models:
         self.dlg_model.closingDialog.connect(self.onCloseGravityDialog)
         self.dlg_model.ok_button.clicked.connect(self.run_gravity_model)
         self.dlg_model.export_button.clicked.connect(self.on_export_click)
+        # окно могли закрыть и открыть заново во время расчета
+        self.dlg_model.ok_button.setEnabled(self.gm_task is None)
         self.dlg_model.show()
 
 
     def run_gravity_model(self):
-        def calculate_distance_in_meters(f1, f2):     
-            EARTH_RADIUS = 6371
-            
-            lat1, lon1 = f1
-            lat2, lon2 = f2
-            lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-            
-            # Haversine formula
-            # https://en.wikipedia.org/wiki/Haversine_formula
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-            c = 2 * math.asin(math.sqrt(a))
-
-            distance = EARTH_RADIUS * c
-            
-            # Конвертация в метры
-            distance_meters = distance * 1000
-
-            return distance_meters
-        
+        # одновременно идет не больше одного расчета: unload() должен отменить каждую задачу
+        if self.gm_task is not None:
+            iface.messageBar().pushMessage('Гравитационная модель', 'Предыдущий расчет еще не завершен', level=Qgis.Warning)
+            return
         # получение данных из формы
         layer_attr = self.dlg_model.comboBox_significance_attr.currentText()
         layer_tc_attr = self.dlg_model.comboBox_significance_attr_2.currentText()
@@ -286,6 +317,10 @@ class Models:
         layer_tc = self.dlg_model.comboBox_feature_layer_2.itemData(self.dlg_model.comboBox_feature_layer_2.currentIndex())
         # max_distance = float(self.dlg_model.textEdit_max_distance.text())
         max_distance = int(self.dlg_model.spinBox.value())
+        lines_mode = self.dlg_model.comboBox_lines_mode.currentIndex()
+        top_k = int(self.dlg_model.spinBox_top_k.value())
+        line_threshold = float(self.dlg_model.doubleSpinBox_line_threshold.value())
+        backend = make_backend(self.dlg_model.comboBox_backend.currentIndex())
 
         # создаем точечный слой поставщиков
         point_layer = QgsVectorLayer("Point?crs=" + layer_tc.crs().authid(), f'{layer_tc.name()} [g. m.]', "memory")
@@ -293,7 +328,6 @@ class Models:
         point_data.addAttributes(layer_tc.fields())
         point_data.addFeatures(layer_tc.getFeatures())
         point_layer.updateFields()
-        QgsProject.instance().addMapLayer(point_layer, False)
         layer_tc = point_layer
 
         # создаем точечный слой потребителей
@@ -302,15 +336,8 @@ class Models:
         point_data.addAttributes(layer.fields())
         point_data.addFeatures(layer.getFeatures())
         point_layer.updateFields()
-        QgsProject.instance().addMapLayer(point_layer, False)
         layer = point_layer
 
-        # создаем линейный слой зоны влияния центра
-        line_layer = QgsVectorLayer('LineString?crs=' + layer.crs().authid(), 'линии [g. m.]', 'memory')
-        line_data = line_layer.dataProvider()
-        line_data.addAttributes([QgsField('f_id', QVariant.Int), QgsField('tc_id', QVariant.Int)])
-        line_layer.updateFields()
-
         # создаем группу и помещаем туда слои
         group = QgsLayerTreeGroup('Гравитационная модель')
         group.insertChildNode(0, QgsLayerTreeLayer(layer))
@@ -321,93 +348,54 @@ class Models:
             layer_tc.dataProvider().addAttributes([QgsField('weight [g. m.]', QVariant.Double)])
             layer_tc.updateFields()
         
-        # для каждой точки делаем рассчет по формуле и записываем результат в слой в соответствующие поля
-        headers = ['f']
-        for tc in layer_tc.getFeatures():
-            headers.append(tc.id())
-        
-        data = []
-        for f in list(layer.getFeatures()):
-            h_dict = {}
-            
-            f_geometry = f.geometry()
-            f_lat = None
-            f_long = None
-            
-            if f_geometry is not None:
-                if f_geometry.type() == QgsWkbTypes.PointGeometry:
-                    point = f_geometry.asPoint()
-                    f_lat = point.y()
-                    f_long = point.x()
-            
-            if f_lat == None or f_long == None:
-                print('Не вышло получить координаты точки.')
-                break
-            
-            f1 = (f_lat, f_long)
-            
-            for tc in layer_tc.getFeatures():
-                tc_geometry = tc.geometry()
-                tc_lat = None
-                tc_long = None
-                
-                if tc_geometry is not None:
-                    if tc_geometry.type() == QgsWkbTypes.PointGeometry:
-                        point = tc_geometry.asPoint()
-                        tc_lat = point.y()
-                        tc_long = point.x()
-                
-                f2 = (tc_lat, tc_long)
-                
-                distance_degrees = f_geometry.distance(tc_geometry)
-                distance_meters = calculate_distance_in_meters(f1, f2)
+        # источники объектов создаются в основном потоке, слои читаются уже в фоновой задаче
+        source = LayerSource(layer)
+        tc_source = LayerSource(layer_tc)
 
-                if distance_meters > max_distance:
-                    h_dict[tc.id()] = 0
-                else:
-                    h_dict[tc.id()] = tc[layer_tc_attr]**alpha / distance_meters**beta
-                    
-                    line_geom = QgsGeometry.fromPolyline([QgsPoint(f.geometry().asPoint()), QgsPoint(tc.geometry().asPoint())])
-                    line_feature = QgsFeature()
-                    line_feature.setGeometry(line_geom)
-                    line_feature.setAttributes([f.id(), tc.id()])
-                    line_data.addFeatures([line_feature])
-            total_h = sum(h_dict.values())
-            row = [f.id()]
-            for tc_id, h in h_dict.items():
-                if total_h != 0:
-                    row.append(round(h / total_h, 4))
-                else:
-                    row.append(0)
-            data.append(row)
+        parameters = {'layer_attr': layer_attr, 'layer_tc_attr': layer_tc_attr,
+                      'alpha': alpha, 'beta': beta, 'max_distance': max_distance,
+                      'lines_mode': lines_mode, 'top_k': top_k, 'line_threshold': line_threshold}
+
+        # слои добавятся в проект, когда задача завершится
+        self.gm_task = GravityTask(source, tc_source, parameters, layer.crs().authid(),
+                                   partial(self.on_gravity_task_finished, layer, layer_tc, group), backend)
+        self.dlg_model.ok_button.setEnabled(False)
+        QgsApplication.taskManager().addTask(self.gm_task)
+
+
+    def on_gravity_task_finished(self, layer, layer_tc, group, task, result):
+        self.gm_task = None
+        try:
+            self.dlg_model.ok_button.setEnabled(True)
+        except RuntimeError:
+            # окно закрыто, пока шел расчет
+            pass
+
+        if not result:
+            if task.exception is not None:
+                iface.messageBar().pushMessage('Гравитационная модель', f'Ошибка расчета: {task.exception}', level=Qgis.Critical)
+            else:
+                iface.messageBar().pushMessage('Гравитационная модель', 'Расчет отменен', level=Qgis.Warning)
+            return
+        if task.skipped:
+            print('Не вышло получить координаты точки.')
+
+        QgsProject.instance().addMapLayer(layer_tc, False)
+        QgsProject.instance().addMapLayer(layer, False)
 
         # добавялем линейный слой в группу
+        line_layer = task.line_layer
         line_layer.setOpacity(0.5)
         QgsProject.instance().addMapLayer(line_layer, False)
         group.insertChildNode(group.children().__len__(), QgsLayerTreeLayer(line_layer))
 
-        gm_data_path = f'{self.plugin_dir}/gm_data/{layer.id()}&{layer_tc.id()}.csv'
-        with open(gm_data_path, 'w', newline='') as csvfile:
-            csvwriter = csv.writer(csvfile)
-            csvwriter.writerow(headers)
-            csvwriter.writerows(data)
-            
-        with open(gm_data_path, 'r') as csvfile:
-            csvreader = csv.reader(csvfile)
-            data = list(csvreader)
-
-        # Получаем заголовки
-        headers = data[0]
-
-        # Проходим по всем столбцам начиная со второго
-        layer_tc.startEditing()
-        for col_index in range(1, len(headers)):
-            tc_id = int(headers[col_index])
-            column_sum = sum(float(row[col_index]) for row in data[1:])
-            tc = layer_tc.getFeature(tc_id)
-            tc['weight [g. m.]'] = int(column_sum)
-            layer_tc.updateFeature(tc)
-        layer_tc.commitChanges()
+        flows = task.flows
+        with self.gm_lock:
+            entry = self.gm_registry.register(layer.id(), layer_tc.id(), flows, task.parameters, line_layer.id(), task.lines)
+        self.gm_writer.submit(self.write_gm_result, entry, flows)
+
+        # вес поставщика - сумма вероятностей по его столбцу
+        write_column(layer_tc, 'weight [g. m.]', flows.col_ids, np.trunc(flows.column_sums()))
 
         # задание стиля для слоя поставщиков
         graduated_size = QgsGraduatedSymbolRenderer('weight [g. m.]')
@@ -462,12 +450,10 @@ class Models:
         layer = self.iface.activeLayer()
         found = False
         if layer != None:
-            files = os.listdir(self.plugin_dir + '/gm_data')
-            for file in files:
-                if layer.id() == file.split('&')[0]:
-                    found = True
-                    layer_tc = QgsProject.instance().mapLayer(file.split('&')[1][:-4])
-                    break
+            entry = self.gm_registry.get(layer.id())
+            if entry is not None:
+                layer_tc = QgsProject.instance().mapLayer(entry.layer_tc_id)
+                found = layer_tc is not None
         if found:
             self.diagram_layer = layer
             layer.selectionChanged.connect(self.on_selection_changed)
@@ -526,56 +512,48 @@ class Models:
 
 
         layer = self.diagram_layer
-        files = os.listdir(self.plugin_dir + '/gm_data')
-        for file in files:
-            if layer.id() == file.split('&')[0]:
-                layer_tc = QgsProject.instance().mapLayer(file.split('&')[1][:-4])
-                break
-            
+        entry = self.gm_registry.get(layer.id())
+        layer_tc = QgsProject.instance().mapLayer(entry.layer_tc_id)
+
         if len(list(layer.selectedFeatures())) != 0:
             
             log('_______________________________________________________________')
             f_id = list(layer.selectedFeatures())[0].id()
             
             diagram_field = self.diagram_label_field
-            gm_data_path = f'{self.plugin_dir}/gm_data/{layer.id()}&{layer_tc.id()}.csv'
-            with open(gm_data_path, 'r') as csvfile:
-                csvreader = csv.reader(csvfile)
-                
-                if diagram_field != None and str(diagram_field) != 'id':
-                    diagram_field = str(diagram_field)
-                    labels = []
-                    
-                    log('if TRUE    ____________________________________')
-                    log(diagram_field, note='diagram field:')
-                    
-                    log('________loop_start________')
-                    for tc_id in next(csvreader)[1:]:
-                        feature = layer_tc.getFeature(int(tc_id))
-                        labels.append(feature[diagram_field])
-                        
-                        log(feature[diagram_field], note='feature[diagram_field]:')
-                        
-                    log('________loop_start________')
-                    log(labels, note='labels:')
-                    log('if TRUE END____________________________________')
-                else:
-                    
-                    log('if FALSE    ______________________________')
-                    log(diagram_field, note='diagram field:')
-                    
-                    labels = next(csvreader)[1:]
-                    log(labels, note='labels')
-                    log('if FALSE END______________________________')
-                    
-                log('________row loop start________')    
-                for row in csvreader:
-                    if row[0] == str(f_id):
-                        values = list(map(float, row[1:]))
-                        log(values, note='values')
-                        break
-                log('________row loop end  ________')
-                
+            flows = self.load_gm_result(entry)
+            row = flows.row_index(f_id)
+            cols, values = flows.row_by_id(f_id)
+            tc_ids = flows.col_ids[cols].tolist()
+            values = values.tolist()
+            log(values, note='values')
+
+            if diagram_field != None and str(diagram_field) != 'id':
+                diagram_field = str(diagram_field)
+                labels = []
+
+                log('if TRUE    ____________________________________')
+                log(diagram_field, note='diagram field:')
+
+                log('________loop_start________')
+                for tc_id in tc_ids:
+                    feature = layer_tc.getFeature(tc_id)
+                    labels.append(feature[diagram_field])
+
+                    log(feature[diagram_field], note='feature[diagram_field]:')
+
+                log('________loop_start________')
+                log(labels, note='labels:')
+                log('if TRUE END____________________________________')
+            else:
+
+                log('if FALSE    ______________________________')
+                log(diagram_field, note='diagram field:')
+
+                labels = [str(tc_id) for tc_id in tc_ids]
+                log(labels, note='labels')
+                log('if FALSE END______________________________')
+
             my_dict = {}
             log('________zip(labels, values)_loop_start________')
             for label, value in zip(labels, values):
@@ -611,134 +589,15 @@ class Models:
                 top_n['др.'] = other_sum
                 my_dict = top_n
 
-            if len(my_dict) != 0:                
-                colors = plt.cm.tab10(np.arange(len(my_dict)))
-                
-                fig, ax = plt.subplots()
-                ax.set_title('Распределение потребителей среди поставщиков', fontsize=10, pad=40)
-                
-                pie = ax.pie(my_dict.values(), startangle=90)
-                
-                centre_circle = plt.Circle((0, 0), 0.50, color='white', fc='white', linewidth=0)
-                ax.add_artist(centre_circle)
-                
-                annotations = []
-                wedges = pie[0]
-                for i, (category, value) in enumerate(my_dict.items()):
-                    angle = pie[0][i].theta1  # Start angle of the slice
-                    angle += (pie[0][i].theta2 - pie[0][i].theta1) / 2 # Mid-angle of the slice
-                    angle_rad = np.deg2rad(angle)
-                    radius = 1.1  # Adjust this value to control the length of the lines
-                
-                    x = radius * np.cos(angle_rad)
-                    y = radius * np.sin(angle_rad)
-                    
-                    # Adjust percentage labels
-                    label_x = 1.5 * np.cos(angle_rad)  # Adjust the position of the label along x-axis
-                    label_y = 1.5 * np.sin(angle_rad)  # Adjust the position of the label along y-axis
-
-                    percent = my_dict[category]*100
-                    value = str(list(my_dict.keys())[i])
-                    if len(value) > 19:
-                        value = value[:18]+'…'
-                    
-                    annotation = ax.annotate('{:.1f}%\n{}'.format(percent, value),
-                                xy=(x, y), xytext=(label_x, label_y),
-                                ha='center', va='center', fontsize=10, color='white',
-                                arrowprops=dict(arrowstyle='-', color=colors[i]),
-                                bbox=dict(boxstyle="round,pad=0.2", fc=colors[i], alpha=1.0, edgecolor='none'))
-                    
-                    annotations.append(annotation)
-
-                for wedge in wedges:
-                    wedge.set_edgecolor('white')
-                    wedge.set_linewidth(1)
-
-                def onclick(event):
-                    edge_highlighed = False
-                    if event.inaxes == ax:
-                        center = (0, 0)  # Center of the pie chart
-                        x, y = event.xdata, event.ydata  # Coordinates of the click event
-
-                        # # Calculate the angle of the click event relative to the center of the pie chart
-                        angle = np.arctan2(y - center[1], x - center[0])
-
-                        # Calculate the angle of the click relative to the starting angle
-                        angle %= 2*np.pi  # Ensure angle is within [0, 360] degrees
-                        if (0 <= angle <= np.pi/2):
-                            angle += 2*np.pi
-
-                        # Calculate the distance between the click event and the center of the pie chart
-                        distance = np.sqrt((x - center[0])**2 + (y - center[1])**2)
-                        # Iterate over the wedges and check if the click event falls within the boundaries of each wedge
-                        for i, wedge in enumerate(wedges):
-                            theta1, theta2 = np.deg2rad(wedge.theta1), np.deg2rad(wedge.theta2)
-                            
-                            if (theta1 <= angle <= theta2) and (distance <= wedge.r + 1):
-                                edge_highlighed = True
-                                # Reduce alpha for all annotations and wedges
-                                for annotation in annotations:
-                                    annotation.set_alpha(0.35)
-
-                                    # Retrieve the bounding box patch object
-                                    bbox_patch = annotation.get_bbox_patch()
-                                    r, g, b, _ = bbox_patch.get_facecolor()
-                                    bbox=dict(boxstyle="round,pad=0.2", fc=(r,g,b,0.35), edgecolor='none')
-                                    annotation.set_bbox(bbox)
-
-                                for wedge in wedges:
-                                    wedge.set_alpha(0.35)
-                                    wedge.set_linewidth(1)
-
-                                current_annotation = annotations[i]
-                                current_wedge = wedges[i]
-
-                                # Set alpha to 1 for the clicked annotation and wedge
-                                current_annotation.set_alpha(1)
-                                current_annotation.set_zorder(12)
-
-                                bbox_patch = current_annotation.get_bbox_patch()
-                                r, g, b, _ = bbox_patch.get_facecolor()
-                                bbox=dict(boxstyle="round,pad=0.2", fc=(r,g,b,1), edgecolor='none')
-                                current_annotation.set_bbox(bbox)
-
-                                current_wedge.set_alpha(1)
-
-                                # Add white border to the clicked wedge
-                                current_wedge.set_linewidth(2)
-                                plt.draw()
-                                break  # Exit loop once a wedge is found
-                            
-                    if not edge_highlighed:
-                        for annotation in annotations:
-                            annotation.set_alpha(1)
-                            # Retrieve the bounding box patch object
-                            bbox_patch = annotation.get_bbox_patch()
-                            r, g, b, _ = bbox_patch.get_facecolor()
-                        
-                            bbox=dict(boxstyle="round,pad=0.2", fc=(r,g,b,1), edgecolor='none')
-                            annotation.set_bbox(bbox)
-                            
-                        for wedge in wedges:
-                            wedge.set_alpha(1)
-                            wedge.set_linewidth(1)
-
-                        plt.draw()
-
-                fig.canvas.mpl_connect('button_press_event', onclick)
-                
-                fig.subplots_adjust(top=0.77, bottom=0.15, left=0.0, right=1)
-                
-                self.dlg_model.layout.takeAt(0).widget().deleteLater()
-                
-                canvas = FigureCanvas(fig)
-                self.dlg_model.layout.addWidget(canvas)
+            if len(my_dict) != 0:
+                # диаграмма перерисовывается на холсте окна, новая фигура не создается
+                self.dlg_model.plot_distribution(my_dict)
 
                 # выделение линий от потребителя к поставщикам
-                line_layer = QgsProject.instance().mapLayersByName('линии [g. m.]')[0]
-                request = QgsFeatureRequest().setFilterExpression(f'{"f_id"} = {f_id}')
-                need_line_ids = [line.id() for line in line_layer.getFeatures(request)]
-                line_layer.selectByIds(need_line_ids)
+                line_layer = QgsProject.instance().mapLayer(entry.line_layer_id) if entry.line_layer_id else None
+                if line_layer is not None and entry.lines is not None and row != -1:
+                    line_indptr, line_ids = entry.lines
+                    line_layer.selectByIds(line_ids[line_indptr[row]:line_indptr[row + 1]].tolist())
 
     # --------------------------------------------------------------------------
     """Модель центральных мест"""
@@ -761,115 +620,121 @@ class Models:
         layer = self.dlg_model.comboBox_feature_layer.itemData(self.dlg_model.comboBox_feature_layer.currentIndex())
         attr = self.dlg_model.comboBox_significance_attr.currentText()
         multiplier = float(self.dlg_model.textEdit_significance_power.text())
-        stop = float(self.dlg_model.textEdit_distance_power.text())
-
-        # добавляем колонку "to", если ее нет
-        if layer.fields().indexFromName('to') == -1: 
-            layer.dataProvider().addAttributes([QgsField('to', QVariant.Int)])
-            layer.updateFields()
-
-        # возвращает id точки для соединения
-        def process_feature(f):
-            f_id = f.id()
-            population = int(f[attr])
-            if population > stop:
-                return f_id
-            else:
-                c = population * multiplier
-                ps = list(layer.getFeatures(QgsFeatureRequest().setFilterExpression(f'{attr} > {c}')))
-                index = QgsSpatialIndex(layer.getFeatures(QgsFeatureRequest().setFilterExpression(f'{attr} > {c}')))
-                if not ps:
-                    return f_id
-                else:
-                    nearest_point_id = index.nearestNeighbor(f.geometry().asPoint(), 1)[0]
-                    return nearest_point_id
-        
-        # выполнение process_feature для каждой точки слоя в режиме многопоточности
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(process_feature, f) for f in list(layer.getFeatures())]
-
-        # запись в колонку 'to' каждой точки - id точки для соединения
-        layer.startEditing()
-        features = list(layer.getFeatures())
-        for i in range(len(futures)):
-            result = futures[i].result()
-            features[i]['to'] = result
-            layer.updateFeature(features[i])
-        layer.commitChanges()
-
-        # ищет связанные точки для данной точки
-        def get_connected_features(feature, layer):
-            features = []  
-            stack = [feature]  
-            while stack:
-                current_feature = stack.pop() 
-                features.append(current_feature)  
-                connect_features = list(layer.getFeatures(QgsFeatureRequest().setFilterExpression(f'"to" = {current_feature.id()} AND @id != {current_feature.id()}')))
-                stack.extend(connect_features)
-            return features
-
-        # возвращает список точек и линий, относящихся к данному центру
-        def process_center(center):
-            result = {'f' : [], 'l': []}
-            features_of_center = get_connected_features(center, layer)
-            # добавляем в слои точки и линии
-            for f in features_of_center:
-                result['f'].append(f)
-                p = list(layer.getFeatures(QgsFeatureRequest().setFilterExpression(f'@id = {f["to"]}')))[0]
-                line_geom = QgsGeometry.fromPolyline([QgsPoint(f.geometry().asPoint()), QgsPoint(p.geometry().asPoint())])
-                line_feature = QgsFeature()
-                line_feature.setGeometry(line_geom)
-                result['l'].append(line_feature)
-            return result
+        # несколько порогов через ';' или пробел - иерархия центров, уровень на каждый порог;
+        # запятая не разделитель: "1,5" - ошибка ввода, а не два порога
+        try:
+            stops = [float(stop) for stop in re.split(r'[;\s]+', self.dlg_model.textEdit_distance_power.text().strip()) if stop]
+        except ValueError:
+            stops = []
+        if not stops:
+            iface.messageBar().pushMessage('Модель центральных мест', "Величины центров - числа через ';' или пробел, дробная часть через точку", level=Qgis.Warning)
+            return
+        backend = make_backend(self.dlg_model.comboBox_backend.currentIndex())
+
+        # координаты и значимость читаются один раз, дальше модель работает с массивами
+        snapshot = snapshot_layer(layer, [attr])
+        ids = snapshot.ids
+        values = snapshot.column(attr)
+
+        # id точки для соединения: сама точка, если ее значимость больше stop, иначе ближайшая
+        # точка со значимостью больше int(значимость) * multiplier (или сама точка, если таких нет);
+        # точка без значимости (NULL) соединяется с ближайшей точкой с положительной значимостью;
+        # поиск соседей от stop не зависит и выполняется один раз для всех уровней
+        nearest = nearest_heavier(snapshot.x, snapshot.y, values, significance_thresholds(values, multiplier), backend)
+
+        # центр каждой точки по ссылкам 'to' (для самого мелкого уровня), уровень центров и
+        # ссылки на центры предыдущего уровня, без запросов к слою
+        to_rows, center, level, parent = center_hierarchy(values, nearest, stops)
+        to = ids[to_rows]
+        parent_ids = np.where(parent >= 0, ids[parent], -1).tolist()
+        center_rows, members, _ = center_members(center)
+
+        # номер цвета палитры для каждого центра - жадная раскраска графа смежности центров,
+        # построенного по принадлежности пунктов, чтобы соприкасающиеся зоны различались;
+        # пункты, линии и зоны берут цвет своего центра
+        palette = np.zeros(len(ids), dtype=np.int64)
+        neighbours = np.searchsorted(center_rows, center_edges(snapshot.x, snapshot.y, center))
+        palette[center_rows] = greedy_coloring(len(center_rows), neighbours, len(PALETTE))
 
         group = QgsLayerTreeGroup('Модель центральных мест')
 
-        centers = list(layer.getFeatures(QgsFeatureRequest().setFilterExpression('@id = "to"')))
-
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(process_center, center) for center in centers]
+        # атрибуты читаются одним запросом без геометрии; геометрии пунктов и центров строятся
+        # как WKB из координат снимка
+        source_attributes = {f.id(): f.attributes() for f in layer.getFeatures(QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry))}
+
+        # исходный слой не изменяется: id точки для соединения ('to'), уровень центра ('level') и
+        # центр предыдущего уровня ('parent') пишутся только в слои результатов; такие же поля,
+        # оставшиеся в исходном слое от прежних версий, перезаписываются
+        fields = QgsFields(layer.fields())
+        for name in ('to', 'level', 'parent'):
+            if fields.indexFromName(name) == -1:
+                fields.append(QgsField(name, QVariant.Int))
+        to_index, level_index, parent_index = (fields.indexFromName(name) for name in ('to', 'level', 'parent'))
+        padding = [None] * (len(fields) - len(layer.fields()))
+        id_list = ids.tolist()
+        to_list = to.tolist()
+        level_list = level.tolist()
+
+        def output_attributes(row):
+            attributes = source_attributes[id_list[row]] + padding
+            attributes[to_index] = to_list[row]
+            attributes[level_index] = level_list[row]
+            attributes[parent_index] = parent_ids[row] if parent_ids[row] != -1 else None
+            return attributes
 
         # создаем точечный слой зоны влияния центра
         point_layer = QgsVectorLayer("Point?crs=" + layer.crs().authid(), 'пункты', "memory")
         point_data = point_layer.dataProvider()
-        point_data.addAttributes(layer.fields())
-        point_data.addAttributes([QgsField('center', QVariant.Int)])
+        point_data.addAttributes(fields)
+        point_data.addAttributes([QgsField('center', QVariant.Int), QgsField('palette', QVariant.Int)])
         point_layer.updateFields()
 
         # создаем линейный слой зоны влияния центра
         line_layer = QgsVectorLayer('LineString?crs=' + layer.crs().authid(), 'линии', 'memory')
         line_data = line_layer.dataProvider()
-        line_data.addAttributes([QgsField('center', QVariant.Int)])
+        line_data.addAttributes([QgsField('center', QVariant.Int), QgsField('f_id', QVariant.Int), QgsField('to', QVariant.Int), QgsField('palette', QVariant.Int)])
         line_layer.updateFields()
         
-        # заполняем слой пунктов и линий объектами
-        for i in range(len(futures)):
-            result = futures[i].result()
-            for f in result['f']:
-                fd = f.fields()
-                a = f.attributes()
-                fd.append(QgsField('center', QVariant.Int))
-                f.setFields(fd)
-                f.setAttributes(a + [centers[i].id()])
-                point_data.addFeatures([f])
-            for f in result['l']:
-                fd = f.fields()
-                a = f.attributes()
-                fd.append(QgsField('center', QVariant.Int))
-                f.setFields(fd)
-                f.setAttributes(a + [centers[i].id()])
-                line_data.addFeatures([f])
+        # заполняем слой пунктов и линий объектами: линия от пункта к точке, с которой он соединен;
+        # объекты строятся по готовой схеме слоя и добавляются пакетами
+        member_ids = ids[members].tolist()
+        member_centers = ids[center[members]].tolist()
+        member_palette = palette[center[members]].tolist()
+        add_features(point_layer,
+                     point_wkb(snapshot.x[members], snapshot.y[members]),
+                     (output_attributes(row) + [center_id, color] for row, center_id, color in zip(members.tolist(), member_centers, member_palette)))
+
+        parents = to_rows[members]
+        add_features(line_layer,
+                     linestring_wkb(snapshot.x[members], snapshot.y[members], snapshot.x[parents], snapshot.y[parents]),
+                     zip(member_centers, member_ids, to[members].tolist(), member_palette))
+
+        # зона обслуживания центра - выпуклая оболочка его пунктов (для одного-двух пунктов или
+        # пунктов на одной прямой - прямоугольник вокруг них), все оболочки строятся одним проходом
+        # по массивам принадлежности; зона есть у каждого центра
+        zone_layer = QgsVectorLayer('Polygon?crs=' + layer.crs().authid(), 'зоны', 'memory')
+        zone_layer.dataProvider().addAttributes([QgsField('center', QVariant.Int), QgsField('level', QVariant.Int), QgsField('members', QVariant.Int), QgsField('palette', QVariant.Int)])
+        zone_layer.updateFields()
+        hull_rows, hull_indptr, hull_x, hull_y = convex_hulls(snapshot.x, snapshot.y, center)
+        member_counts = np.bincount(center[center >= 0], minlength=len(ids))
+        add_features(zone_layer,
+                     polygon_wkb(hull_indptr, hull_x, hull_y),
+                     zip(ids[hull_rows].tolist(), level[hull_rows].tolist(), member_counts[hull_rows].tolist(), palette[hull_rows].tolist()))
+        zone_layer.setOpacity(0.4)
 
         # добавляем слои в проект
         QgsProject.instance().addMapLayer(point_layer, False)
         QgsProject.instance().addMapLayer(line_layer, False)
+        QgsProject.instance().addMapLayer(zone_layer, False)
 
         # создаем слой центров
         centers_layer = QgsVectorLayer("Point?crs=" + layer.crs().authid(), "центры", "memory")
         prov = centers_layer.dataProvider()
-        prov.addAttributes(layer.fields())
+        prov.addAttributes(fields)
         centers_layer.updateFields()
-        prov.addFeatures(centers)
+        add_features(centers_layer,
+                     point_wkb(snapshot.x[center_rows], snapshot.y[center_rows]),
+                     (output_attributes(row) for row in center_rows.tolist()))
 
         # задание стиля слою центров
         symbol = QgsMarkerSymbol.createSimple({'name': 'circle', 'color': 'orange'})
@@ -880,34 +745,16 @@ class Models:
 
         QgsProject.instance().addMapLayer(centers_layer, False)
 
-        # создание стиля на основе уникальных значений атрибута для пунктов
-        renderer = QgsCategorizedSymbolRenderer('center') 
-        unique_values = point_layer.uniqueValues(point_layer.fields().indexOf('center'))
-        for value in unique_values:
-            symbol = QgsSymbol.defaultSymbol(point_layer.geometryType())
-            category = QgsRendererCategory(value, symbol, str(value))
-            renderer.addCategory(category)
-
-        # применение стиля к слою пунктов
-        point_layer.setRenderer(renderer)
-        point_layer.triggerRepaint()
-
-        # создание стиля на основе уникальных значений атрибута для линий
-        renderer = QgsCategorizedSymbolRenderer('center') 
-        unique_values = line_layer.uniqueValues(line_layer.fields().indexOf('center'))
-        for value in unique_values:
-            symbol = QgsSymbol.defaultSymbol(line_layer.geometryType())
-            category = QgsRendererCategory(value, symbol, str(value))
-            renderer.addCategory(category)
-
-        # срименение стиля к слою линий
-        line_layer.setRenderer(renderer)
-        line_layer.triggerRepaint()
+        # стиль пунктов, линий и зон: один символ, цвет центра из палитры по полю 'palette'
+        for result_layer in (point_layer, line_layer, zone_layer):
+            result_layer.setRenderer(palette_renderer(result_layer, 'palette'))
+            result_layer.triggerRepaint()
 
         # добавлям слои в группу
         group.insertChildNode(0, QgsLayerTreeLayer(centers_layer))
         group.insertChildNode(group.children().__len__(), QgsLayerTreeLayer(point_layer))
         group.insertChildNode(group.children().__len__(), QgsLayerTreeLayer(line_layer))
+        group.insertChildNode(group.children().__len__(), QgsLayerTreeLayer(zone_layer))
 
         # добавляем созданную группу в проект
         root = QgsProject().instance().layerTreeRoot()
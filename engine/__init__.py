@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""Вычислительное ядро моделей LightModels.
+
+Модули пакета работают с массивами NumPy и не обращаются к слоям QGIS.
+"""
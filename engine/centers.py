@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Модель центральных мест по массивам координат и значимости."""
+
+import numpy as np
+
+from .parallel import SerialBackend
+from .spatial_index import KDTree
+
+
+# число точек в одной части поиска nearest_heavier
+QUERY_CHUNK = 4096
+
+# число ближайших пунктов, по которым зоны разных центров считаются соседними при раскраске
+NEIGHBOURS = 4
+
+
+def nearest_heavier(x, y, weights, thresholds, backend=None, chunk_size=QUERY_CHUNK):
+    """Для каждой точки - номер ближайшей точки с весом больше ее порога.
+
+    Поиск идет по одному KD-дереву с наибольшим весом в узлах, поэтому общее
+    время близко к O(N log N). Расстояние евклидово в координатах слоя. Точки
+    делятся на части по chunk_size, части считаются исполнителем backend (по
+    умолчанию SerialBackend), дерево строится один раз на исполнителя.
+
+    :returns: номера точек, -1 - если подходящей точки нет.
+    """
+    arrays = {'x': np.asarray(x, dtype=float), 'y': np.asarray(y, dtype=float),
+              'weights': np.asarray(weights, dtype=float), 'thresholds': np.asarray(thresholds, dtype=float)}
+    n = len(arrays['x'])
+    tasks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    backend = backend or SerialBackend()
+    parts = list(backend.map(_prepare_nearest, _compute_nearest, arrays, tasks))
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def _prepare_nearest(arrays):
+    points = np.column_stack([arrays['x'], arrays['y']])
+    return {'points': points, 'thresholds': arrays['thresholds'],
+            'tree': KDTree(points, weights=arrays['weights'])}
+
+
+def _compute_nearest(state, start, stop):
+    return state['tree'].nearest_heavier_many(state['points'][start:stop], state['thresholds'][start:stop])
+
+
+def connect_points(significance, nearest, stop):
+    """Номер точки, с которой соединяется каждая точка.
+
+    nearest - результат nearest_heavier с порогами int(значимость) * multiplier,
+    от stop он не зависит. Точка со значимостью (целая часть) больше stop
+    соединяется сама с собой, остальные - с точкой nearest, или сама с собой,
+    если такой точки нет.
+    """
+    population = np.trunc(np.asarray(significance, dtype=float))
+    rows = np.arange(len(population))
+    return np.where((population > stop) | (nearest == -1), rows, nearest)
+
+
+def significance_thresholds(significance, multiplier):
+    """Пороги для nearest_heavier: int(значимость) * multiplier.
+
+    Точка без значимости (NaN) получает порог 0 и соединяется с ближайшей
+    точкой с положительной значимостью, а не становится центром.
+    """
+    population = np.nan_to_num(np.trunc(np.asarray(significance, dtype=float)), nan=0.0)
+    return population * multiplier
+
+
+def resolve_centers(to):
+    """Центр каждой точки по ссылкам to (номер точки, с которой она соединена).
+
+    Центр - точка, соединенная сама с собой. Ссылки сжимаются удвоением
+    (root = root[root]), поэтому хватает O(log N) векторных проходов. Точки,
+    цепочка которых уходит в цикл без центра, получают -1.
+    """
+    to = np.asarray(to, dtype=np.int64)
+    root = to.copy()
+    for _ in range(max(len(to), 1).bit_length() + 1):
+        jumped = root[root]
+        if np.array_equal(jumped, root):
+            break
+        root = jumped
+    return np.where(to[root] == root, root, -1) if len(to) else root
+
+
+def center_members(center):
+    """Точки, сгруппированные по центрам.
+
+    :returns: (center_rows, order, indptr): центры по возрастанию номера и
+        номера точек так, что члены центра center_rows[i] - это
+        order[indptr[i]:indptr[i + 1]], первым идет сам центр.
+    """
+    center = np.asarray(center, dtype=np.int64)
+    rows = np.arange(len(center))
+    member = np.flatnonzero(center >= 0)
+    order = member[np.lexsort((rows[member] != center[member], center[member]))]
+    center_rows, counts = np.unique(center[member], return_counts=True)
+    indptr = np.zeros(len(center_rows) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return center_rows, order, indptr
+
+
+def center_hierarchy(significance, nearest, stops):
+    """Иерархия центров для нескольких порогов stop за один расчет соседей.
+
+    nearest от stop не зависит и используется на всех уровнях, каждый уровень
+    добавляет только connect_points и resolve_centers. Уровни нумеруются с 1
+    от наибольшего порога; центр уровня остается центром и на всех следующих
+    (более мелких) уровнях.
+
+    :returns: (to, center, level, parent): to и center - соединения и центры
+        самого мелкого уровня, level - первый уровень, на котором точка стала
+        центром (0 - не центр), parent - для центра номер центра предыдущего
+        уровня, в который он входит, для остальных точек - их центр; -1, если
+        такого нет.
+    """
+    if not len(stops):
+        raise ValueError('не задано ни одного порога stop')
+    significance = np.asarray(significance, dtype=float)
+    rows = np.arange(len(significance))
+    level = np.zeros(len(significance), dtype=np.int64)
+    parent = np.full(len(significance), -1, dtype=np.int64)
+    to = rows
+    center = rows
+    previous = None
+    for k, stop in enumerate(sorted(stops, reverse=True), 1):
+        to = connect_points(significance, nearest, stop)
+        center = resolve_centers(to)
+        new = (center == rows) & (level == 0)
+        level[new] = k
+        if previous is not None:
+            parent[new] = previous[new]
+        previous = center
+
+    ordinary = level == 0
+    parent[ordinary] = center[ordinary]
+    return to, center, level, parent
+
+
+def center_edges(x, y, center, k=NEIGHBOURS):
+    """Ребра графа смежности центров по принадлежности пунктов.
+
+    Центры соседние, если среди k ближайших пунктов какого-либо пункта одного
+    центра есть пункт другого: их зоны обслуживания соприкасаются. Соседи всех
+    пунктов ищутся одним проходом по листам KD-дерева. Ребра
+    неориентированные, без повторов, в виде (a, b) с a < b, где a и b - номера
+    центров, как в center.
+    """
+    center = np.asarray(center, dtype=np.int64)
+    member = np.flatnonzero(center >= 0)
+    points = np.column_stack([np.asarray(x, dtype=float)[member], np.asarray(y, dtype=float)[member]])
+    neighbours = KDTree(points).query_knn_all(k)
+    member_center = center[member]
+    a = np.repeat(member_center, neighbours.shape[1])
+    b = member_center[neighbours].ravel()
+    edges = np.column_stack([a, b])[a != b]
+    if not len(edges):
+        return np.empty((0, 2), dtype=np.int64)
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+
+def greedy_coloring(n, edges, n_colors):
+    """Номер цвета для каждой вершины так, чтобы соседние по возможности различались.
+
+    Вершины обходятся по убыванию степени (Уэлш - Пауэлл), каждая получает
+    наименьший цвет, не занятый соседями. Если все n_colors заняты, берется
+    цвет, реже всего встречающийся у соседей.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    heads = np.concatenate([edges[:, 0], edges[:, 1]])
+    tails = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(heads, kind='stable')
+    neighbours = tails[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=n), out=indptr[1:])
+
+    colors = np.full(n, -1, dtype=np.int64)
+    for v in np.argsort(-np.diff(indptr), kind='stable').tolist():
+        used = colors[neighbours[indptr[v]:indptr[v + 1]]]
+        counts = np.bincount(used[used >= 0], minlength=n_colors)[:n_colors]
+        free = np.flatnonzero(counts == 0)
+        colors[v] = free[0] if len(free) else int(np.argmin(counts))
+    return colors
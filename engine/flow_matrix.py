@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Разреженная матрица вероятностей гравитационной модели.
+
+Формат файла результатов (.gmb):
+    сигнатура MAGIC, версия и длина заголовка (два uint32, little-endian);
+    заголовок JSON с размерами и смещениями массивов и метаданными запуска;
+    массивы row_ids, col_ids, indptr, indices, data, выровненные по 8 байт.
+Файл открывается через np.memmap, поэтому строка любого потребителя читается
+без загрузки всего файла.
+"""
+
+import csv
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b'LMGM'
+VERSION = 1
+ALIGNMENT = 8
+
+# массивы файла в порядке записи
+ARRAYS = (
+    ('row_ids', '<i8'),
+    ('col_ids', '<i8'),
+    ('indptr', '<i8'),
+    ('indices', '<i4'),
+    ('data', '<f8'),
+)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class FlowMatrix:
+    """Матрица потребители x поставщики в формате CSR.
+
+    Хранятся только ненулевые вероятности: для строки i номера столбцов лежат
+    в indices[indptr[i]:indptr[i + 1]], значения - в data. row_ids и col_ids
+    связывают строки и столбцы с id объектов слоев потребителей и поставщиков,
+    metadata - словарь с параметрами запуска, сохраняемый в заголовке файла.
+    """
+
+    def __init__(self, row_ids, col_ids, indptr, indices, data, metadata=None):
+        self.row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.col_ids = np.asarray(col_ids, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=float)
+        self.metadata = dict(metadata or {})
+        self._sorted_ids = None
+        self._row_order = None
+
+    @classmethod
+    def from_pairs(cls, row_ids, col_ids, rows, cols, values, metadata=None):
+        """Матрица из пар (rows, cols, values), отсортированных по rows.
+
+        Нулевые значения отбрасываются.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        nonzero = values != 0
+        rows, cols, values = rows[nonzero], np.asarray(cols, dtype=np.int64)[nonzero], values[nonzero]
+        indptr = np.zeros(len(row_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(row_ids)), out=indptr[1:])
+        return cls(row_ids, col_ids, indptr, cols, values, metadata)
+
+    @property
+    def shape(self):
+        return len(self.row_ids), len(self.col_ids)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def row(self, i):
+        """Номера столбцов и значения ненулевых элементов строки i."""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def row_index(self, f_id):
+        """Номер строки потребителя с id объекта f_id или -1, если его нет.
+
+        Поиск двоичный: по row_ids, если они возрастают (так пишет модель),
+        иначе по отсортированной копии, построенной при первом обращении.
+        """
+        if self._sorted_ids is None:
+            if np.all(self.row_ids[1:] > self.row_ids[:-1]):
+                self._sorted_ids = self.row_ids
+            else:
+                self._row_order = np.argsort(self.row_ids, kind='stable')
+                self._sorted_ids = self.row_ids[self._row_order]
+
+        pos = int(np.searchsorted(self._sorted_ids, f_id))
+        if pos == len(self._sorted_ids) or self._sorted_ids[pos] != f_id:
+            return -1
+        if self._row_order is None:
+            return pos
+        return int(self._row_order[pos])
+
+    def row_by_id(self, f_id):
+        """Строка потребителя с id объекта f_id; пустая, если его нет в матрице."""
+        i = self.row_index(f_id)
+        if i == -1:
+            return self.indices[:0], self.data[:0]
+        return self.row(i)
+
+    def column_sums(self):
+        """Суммы вероятностей по столбцам (поставщикам)."""
+        return np.bincount(self.indices, weights=self.data, minlength=len(self.col_ids))
+
+    def to_dense(self):
+        dense = np.zeros(self.shape)
+        rows = np.repeat(np.arange(len(self.row_ids)), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+        return dense
+
+    def save(self, path):
+        """Сохранение в двоичный файл результатов."""
+        arrays = [np.ascontiguousarray(getattr(self, name), dtype=dtype) for name, dtype in ARRAYS]
+        layout = {}
+        offset = 0
+        for (name, _), array in zip(ARRAYS, arrays):
+            offset = _align(offset)
+            layout[name] = [offset, len(array)]
+            offset += array.nbytes
+
+        header = json.dumps({'rows': len(self.row_ids), 'cols': len(self.col_ids), 'nnz': self.nnz,
+                             'arrays': layout, 'metadata': self.metadata}).encode('utf-8')
+        data_start = _align(len(MAGIC) + 8 + len(header))
+
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<II', VERSION, len(header)))
+            file.write(header)
+            for (name, _), array in zip(ARRAYS, arrays):
+                file.write(b'\0' * (data_start + layout[name][0] - file.tell()))
+                file.write(memoryview(array).cast('B'))
+
+    @staticmethod
+    def read_header(path):
+        """Заголовок файла результатов без чтения массивов."""
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} не является файлом результатов гравитационной модели')
+            version, header_length = struct.unpack('<II', file.read(8))
+            if version != VERSION:
+                raise ValueError(f'{path}: неподдерживаемая версия формата {version}')
+            header = json.loads(file.read(header_length).decode('utf-8'))
+        header['data_start'] = _align(len(MAGIC) + 8 + header_length)
+        return header
+
+    @classmethod
+    def load(cls, path):
+        """Открытие файла результатов; массивы отображаются в память, а не читаются."""
+        header = cls.read_header(path)
+        data_start = header['data_start']
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        arrays = []
+        for name, dtype in ARRAYS:
+            offset, length = header['arrays'][name]
+            start = data_start + offset
+            arrays.append(buffer[start:start + length * np.dtype(dtype).itemsize].view(dtype))
+        return cls(*arrays, metadata=header.get('metadata'))
+
+    @classmethod
+    def read_csv(cls, path):
+        """Чтение плотной таблицы CSV в формате write_csv."""
+        with open(path, 'r', newline='') as csvfile:
+            csvreader = csv.reader(csvfile)
+            col_ids = [int(tc_id) for tc_id in next(csvreader)[1:]]
+            row_ids = []
+            rows = []
+            cols = []
+            values = []
+            for i, row in enumerate(csvreader):
+                row_ids.append(int(row[0]))
+                row_values = np.array(row[1:], dtype=float)
+                nonzero = np.flatnonzero(row_values)
+                rows.append(np.full(len(nonzero), i))
+                cols.append(nonzero)
+                values.append(row_values[nonzero])
+
+        if not rows:
+            return cls.from_pairs(row_ids, col_ids, [], [], [])
+        return cls.from_pairs(row_ids, col_ids, np.concatenate(rows), np.concatenate(cols), np.concatenate(values))
+
+    def write_csv(self, path):
+        """Запись в плотную таблицу CSV: строка заголовка 'f', id поставщиков,
+        затем по строке на потребителя."""
+        with open(path, 'w', newline='') as csvfile:
+            csvwriter = csv.writer(csvfile)
+            csvwriter.writerow(['f'] + self.col_ids.tolist())
+            for i, f_id in enumerate(self.row_ids.tolist()):
+                row = [0] * len(self.col_ids)
+                cols, values = self.row(i)
+                for j, value in zip(cols.tolist(), values.tolist()):
+                    row[j] = value
+                csvwriter.writerow([f_id] + row)
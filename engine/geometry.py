@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Пакетное построение геометрий в формате WKB из массивов координат."""
+
+import numpy as np
+
+
+WKB_LITTLE_ENDIAN = 1
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+
+# WKB точки: порядок байт, тип и координаты (x, y)
+POINT_DTYPE = np.dtype([
+    ('byte_order', 'u1'),
+    ('type', '<u4'),
+    ('coords', '<f8', (2,)),
+])
+
+# WKB отрезка: порядок байт, тип, число точек и две точки (x, y)
+LINESTRING_DTYPE = np.dtype([
+    ('byte_order', 'u1'),
+    ('type', '<u4'),
+    ('count', '<u4'),
+    ('coords', '<f8', (4,)),
+])
+
+# заголовок WKB полигона из одного кольца: порядок байт, тип, число колец, число точек кольца
+POLYGON_HEADER_DTYPE = np.dtype([
+    ('byte_order', 'u1'),
+    ('type', '<u4'),
+    ('rings', '<u4'),
+    ('count', '<u4'),
+])
+
+
+def _split_records(records):
+    buffer = records.tobytes()
+    size = records.dtype.itemsize
+    return [buffer[start:start + size] for start in range(0, len(buffer), size)]
+
+
+def point_wkb(x, y):
+    """WKB точек (x, y) для QgsGeometry.fromWkb, все записи собираются в одном массиве."""
+    records = np.empty(len(x), dtype=POINT_DTYPE)
+    records['byte_order'] = WKB_LITTLE_ENDIAN
+    records['type'] = WKB_POINT
+    records['coords'] = np.column_stack([x, y])
+    return _split_records(records)
+
+
+def linestring_wkb(x1, y1, x2, y2):
+    """WKB отрезков (x1, y1) - (x2, y2) для QgsGeometry.fromWkb.
+
+    Все отрезки собираются в одном массиве и разрезаются на bytes по записям.
+    """
+    records = np.empty(len(x1), dtype=LINESTRING_DTYPE)
+    records['byte_order'] = WKB_LITTLE_ENDIAN
+    records['type'] = WKB_LINESTRING
+    records['count'] = 2
+    records['coords'] = np.column_stack([x1, y1, x2, y2])
+    return _split_records(records)
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _half_hull(points):
+    hull = []
+    for p in points:
+        while len(hull) >= 2 and _cross(hull[-2], hull[-1], p) <= 0:
+            hull.pop()
+        hull.append(p)
+    return hull
+
+
+def convex_hulls(x, y, labels, pad=None):
+    """Выпуклые оболочки точек, сгруппированных по labels (-1 - без группы).
+
+    Все точки сортируются одним lexsort по (группа, x, y), затем для каждой
+    группы строится оболочка алгоритмом Эндрю за линейное время. Если оболочка
+    вырождена (меньше трех точек или все на одной прямой), группа получает
+    прямоугольник вокруг своих точек, расширенный на pad (по умолчанию 1%
+    размера всех точек), так что полигон есть у каждой группы.
+
+    :returns: (hull_labels, indptr, hull_x, hull_y): вершины оболочки группы
+        hull_labels[i] лежат в hull_x/hull_y[indptr[i]:indptr[i + 1]] против
+        часовой стрелки, кольцо не замкнуто.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    labels = np.asarray(labels, dtype=np.int64)
+    grouped = np.flatnonzero(labels >= 0)
+    if pad is None:
+        extent = max(np.ptp(x[grouped]), np.ptp(y[grouped])) if len(grouped) else 0.0
+        pad = extent * 0.01 if extent > 0 else 1.0
+    order = grouped[np.lexsort((y[grouped], x[grouped], labels[grouped]))]
+    sorted_labels = labels[order]
+    bounds = np.flatnonzero(np.diff(sorted_labels)) + 1
+    starts = np.concatenate([[0], bounds]).tolist() if len(order) else []
+    ends = np.concatenate([bounds, [len(order)]]).tolist()
+    xs = x[order].tolist()
+    ys = y[order].tolist()
+
+    hull_labels = []
+    counts = []
+    hull_x = []
+    hull_y = []
+    for start, end in zip(starts, ends):
+        points = list(zip(xs[start:end], ys[start:end]))
+        hull = []
+        if end - start >= 3:
+            lower = _half_hull(points)
+            upper = _half_hull(reversed(points))
+            hull = lower[:-1] + upper[:-1]
+        if len(hull) < 3:
+            # точки отсортированы по x, поэтому по x границы - первая и последняя
+            x_min, x_max = points[0][0] - pad, points[-1][0] + pad
+            y_min, y_max = min(ys[start:end]) - pad, max(ys[start:end]) + pad
+            hull = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
+        hull_labels.append(int(sorted_labels[start]))
+        counts.append(len(hull))
+        hull_x.extend(p[0] for p in hull)
+        hull_y.extend(p[1] for p in hull)
+
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return np.array(hull_labels, dtype=np.int64), indptr, np.array(hull_x), np.array(hull_y)
+
+
+def polygon_wkb(indptr, x, y):
+    """WKB полигонов из одного внешнего кольца: вершины полигона i -
+    x/y[indptr[i]:indptr[i + 1]], кольцо замыкается первой вершиной."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    wkbs = []
+    for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+        coords = np.empty((end - start + 1, 2))
+        coords[:-1, 0] = x[start:end]
+        coords[:-1, 1] = y[start:end]
+        coords[-1] = coords[0]
+        header = np.array([(WKB_LITTLE_ENDIAN, WKB_POLYGON, 1, len(coords))], dtype=POLYGON_HEADER_DTYPE)
+        wkbs.append(header.tobytes() + coords.astype('<f8').tobytes())
+    return wkbs
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""Векторизованный расчет гравитационной модели."""
+
+import math
+
+import numpy as np
+
+from .parallel import SerialBackend
+from .spatial_index import KDTree
+
+
+EARTH_RADIUS = 6371  # км
+
+# число потребителей, обрабатываемых за один шаг
+BLOCK_SIZE = 1024
+
+# режимы вывода линий потоков, в порядке списка comboBox_lines_mode
+LINES_ALL = 0
+LINES_TOP_K = 1
+LINES_THRESHOLD = 2
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Расстояние в метрах между точками, координаты в градусах.
+
+    Формула гаверсинусов (https://en.wikipedia.org/wiki/Haversine_formula),
+    аргументы поэлементно приводятся к общей форме по правилам NumPy.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    distance = EARTH_RADIUS * c
+
+    # Конвертация в метры
+    return distance * 1000
+
+
+def unit_vectors(lat, lon):
+    """Точки на единичной сфере: хорда между ними монотонна расстоянию по сфере."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def candidate_pairs(tree, f_lat, f_lon, tc_lat, tc_lon, max_distance):
+    """Пары потребитель-поставщик на расстоянии не больше max_distance.
+
+    tree - KDTree над unit_vectors(tc_lat, tc_lon). Кандидаты отбираются по
+    хорде, затем проверяются точным расстоянием.
+
+    :returns: (rows, cols, distance), отсортированные по rows, затем по cols.
+    """
+    angle = min(max_distance / (EARTH_RADIUS * 1000), math.pi)
+    chord = 2 * math.sin(angle / 2) * (1 + 1e-9) + 1e-12
+
+    rows, cols = tree.query_radius_many(unit_vectors(f_lat, f_lon), chord)
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+
+    distance = haversine(np.take(f_lat, rows), np.take(f_lon, rows), np.take(tc_lat, cols), np.take(tc_lon, cols))
+    keep = distance <= max_distance
+    return rows[keep], cols[keep], distance[keep]
+
+
+def attraction(significance, distance, alpha, beta, max_distance):
+    """Притяжение significance**alpha / distance**beta.
+
+    Пары дальше max_distance и поставщики без значимости (NaN) получают 0,
+    совпадающие с потребителем поставщики - бесконечность.
+    """
+    significance = np.asarray(significance, dtype=float)
+    distance = np.asarray(distance, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.power(significance, alpha) / np.power(distance, beta)
+    h[np.isnan(h)] = 0
+    h[distance > max_distance] = 0
+    return h
+
+
+def normalize_pairs(rows, h, n_rows, decimals=4):
+    """Вероятности выбора поставщиков для пар (rows, h).
+
+    Притяжение каждой пары делится на сумму по ее строке. Строки с нулевой
+    суммой остаются нулевыми. Если в строке есть поставщики на нулевом
+    расстоянии, вероятность делится поровну между ними.
+    """
+    h = np.asarray(h, dtype=float)
+    coincident = np.isinf(h)
+    if coincident.any():
+        rows_coincident = np.zeros(n_rows, dtype=bool)
+        rows_coincident[rows[coincident]] = True
+        h = np.where(rows_coincident[rows], coincident, h)
+
+    total = np.bincount(rows, weights=h, minlength=n_rows)[rows]
+    probabilities = np.divide(h, total, out=np.zeros_like(h), where=total != 0)
+    return np.round(probabilities, decimals)
+
+
+def gravity_blocks(f_lat, f_lon, tc_lat, tc_lon, tc_significance, alpha, beta, max_distance,
+                   block_size=BLOCK_SIZE, backend=None):
+    """Расчет модели блоками потребителей.
+
+    Поставщики индексируются KD-деревом один раз на исполнителя backend (по
+    умолчанию SerialBackend), для каждого потребителя рассматриваются только
+    поставщики в радиусе max_distance. Для каждого блока по порядку возвращает
+    кортеж (start, rows, cols, probabilities): пары в радиусе (номера строк
+    сквозные) и вероятности для них.
+    """
+    arrays = {name: np.asarray(v, dtype=float) for name, v in
+              zip(('f_lat', 'f_lon', 'tc_lat', 'tc_lon', 'tc_significance'), (f_lat, f_lon, tc_lat, tc_lon, tc_significance))}
+    n = len(arrays['f_lat'])
+    tasks = [(start, min(start + block_size, n), alpha, beta, max_distance) for start in range(0, n, block_size)]
+    backend = backend or SerialBackend()
+    yield from backend.map(_prepare_blocks, _compute_block, arrays, tasks)
+
+
+def _prepare_blocks(arrays):
+    state = dict(arrays)
+    state['tree'] = KDTree(unit_vectors(arrays['tc_lat'], arrays['tc_lon']))
+    return state
+
+
+def _compute_block(state, start, stop, alpha, beta, max_distance):
+    rows, cols, probabilities = gravity_block(state['tree'], state['f_lat'][start:stop], state['f_lon'][start:stop],
+                                              state['tc_lat'], state['tc_lon'], state['tc_significance'],
+                                              alpha, beta, max_distance)
+    return start, rows + start, cols, probabilities
+
+
+def gravity_block(tree, f_lat, f_lon, tc_lat, tc_lon, tc_significance, alpha, beta, max_distance):
+    """Пары в радиусе и вероятности для одного блока потребителей.
+
+    tree - KDTree над unit_vectors(tc_lat, tc_lon), номера строк считаются от
+    начала блока.
+    """
+    rows, cols, distance = candidate_pairs(tree, f_lat, f_lon, tc_lat, tc_lon, max_distance)
+    h = attraction(tc_significance[cols], distance, alpha, beta, max_distance)
+    return rows, cols, normalize_pairs(rows, h, len(f_lat))
+
+
+def line_mask(rows, probabilities, n_rows, mode=LINES_ALL, top_k=1, threshold=0.0):
+    """Маска пар, для которых строятся линии потоков.
+
+    LINES_ALL - все пары в радиусе, LINES_TOP_K - не более top_k пар с
+    наибольшей ненулевой вероятностью у каждого потребителя,
+    LINES_THRESHOLD - пары с вероятностью не ниже threshold.
+    """
+    rows = np.asarray(rows)
+    probabilities = np.asarray(probabilities, dtype=float)
+    if mode == LINES_THRESHOLD:
+        return probabilities >= threshold
+    if mode == LINES_TOP_K:
+        # место пары в своей строке по убыванию вероятности
+        order = np.lexsort((-probabilities, rows))
+        row_start = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=row_start[1:])
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - row_start[rows[order]]
+        return (rank < top_k) & (probabilities > 0)
+    return np.ones(len(rows), dtype=bool)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Способы выполнения вычислительных ядер: последовательно или в процессах.
+
+Ядро задается парой функций уровня модуля: prepare(arrays) -> state
+вызывается один раз на исполнителя и готовит общие структуры (например,
+KD-дерево), function(state, *args) считает одну часть задачи. Входные массивы
+передаются процессам через разделяемую память (multiprocessing.shared_memory),
+а не сериализуются для каждой части.
+
+Пула потоков нет: поиск по KD-дереву - цикл на Python, который держит GIL, и
+потоки не дают ускорения.
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# способы выполнения, в порядке списка comboBox_backend
+BACKEND_SERIAL = 0
+BACKEND_PROCESS = 1
+
+# состояние процесса пула, заполняется в _init_worker
+_worker = {}
+
+
+def share_array(array):
+    """Копия массива в разделяемой памяти.
+
+    :returns: (SharedMemory, описание (имя, форма, тип) для attach_array).
+    """
+    array = np.ascontiguousarray(array)
+    # блок нулевого размера создать нельзя
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(descriptor):
+    """Подключение к массиву, созданному share_array; возвращает (SharedMemory, массив)."""
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def python_executable():
+    """Интерпретатор для дочерних процессов.
+
+    Внутри QGIS sys.executable указывает на qgis, а не на python; на Windows
+    используется pythonw.exe, чтобы процессы не открывали окна консоли.
+    """
+    if sys.platform == 'win32':
+        candidates = [os.path.join(sys.exec_prefix, 'pythonw.exe'), os.path.join(sys.exec_prefix, 'python.exe')]
+    elif os.path.basename(sys.executable).startswith('python'):
+        return sys.executable
+    else:
+        candidates = [os.path.join(sys.exec_prefix, 'bin', 'python%d.%d' % sys.version_info[:2]),
+                      os.path.join(sys.exec_prefix, 'bin', 'python%d' % sys.version_info[0])]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return sys.executable
+
+
+def process_context():
+    """Контекст spawn: fork небезопасен в процессе с потоками Qt."""
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(python_executable())
+    return context
+
+
+def _init_worker(prepare, descriptors):
+    shms = []
+    arrays = {}
+    for name, descriptor in descriptors.items():
+        shm, arrays[name] = attach_array(descriptor)
+        shms.append(shm)
+    _worker['shms'] = shms
+    _worker['state'] = prepare(arrays)
+
+
+def _call(function, args):
+    return function(_worker['state'], *args)
+
+
+class SerialBackend:
+    """Все части считаются по очереди в текущем потоке."""
+
+    def __init__(self, workers=None):
+        self.workers = 1
+
+    def map(self, prepare, function, arrays, tasks):
+        """Результаты function(state, *args) для каждого args из tasks, по порядку."""
+        state = prepare(arrays)
+        for args in tasks:
+            yield function(state, *args)
+
+
+class ProcessBackend:
+    """Пул процессов; массивы передаются через разделяемую память.
+
+    Каждый процесс один раз подключается к массивам и вызывает prepare. При
+    одной части или одном процессе расчет идет в текущем процессе. Если
+    генератор map закрыт раньше времени (отмена), оставшиеся части снимаются.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+
+    def map(self, prepare, function, arrays, tasks):
+        tasks = list(tasks)
+        if self.workers == 1 or len(tasks) <= 1:
+            yield from SerialBackend().map(prepare, function, arrays, tasks)
+            return
+
+        shms = []
+        executor = None
+        try:
+            descriptors = {}
+            for name, array in arrays.items():
+                shm, descriptors[name] = share_array(array)
+                shms.append(shm)
+
+            executor = ProcessPoolExecutor(max_workers=min(self.workers, len(tasks)), mp_context=process_context(),
+                                           initializer=_init_worker, initargs=(prepare, descriptors))
+            futures = [executor.submit(_call, function, args) for args in tasks]
+            for future in futures:
+                yield future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+
+BACKENDS = {
+    BACKEND_SERIAL: SerialBackend,
+    BACKEND_PROCESS: ProcessBackend,
+}
+
+
+def make_backend(kind=BACKEND_SERIAL, workers=None):
+    """Исполнитель по номеру способа выполнения."""
+    return BACKENDS[kind](workers)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Реестр результатов гравитационной модели."""
+
+import os
+import re
+
+from .flow_matrix import FlowMatrix
+
+
+RESULT_EXTENSION = '.gmb'
+
+
+class ResultEntry:
+    """Результат одного запуска: слои, файл в gm_data и параметры модели.
+
+    flows - открытая матрица результатов (None, пока к ней не обращались),
+    lines - (line_indptr, line_ids) для слоя линий line_layer_id.
+    """
+
+    def __init__(self, layer_id, layer_tc_id, path, parameters=None, flows=None,
+                 line_layer_id=None, lines=None):
+        self.layer_id = layer_id
+        self.layer_tc_id = layer_tc_id
+        self.path = path
+        self.parameters = dict(parameters or {})
+        self.flows = flows
+        self.line_layer_id = line_layer_id
+        self.lines = lines
+
+    def layer_ids(self):
+        """Слои, при удалении которых результат теряет смысл."""
+        return [self.layer_id, self.layer_tc_id]
+
+    def metadata(self):
+        """Метаданные для заголовка файла, по ним реестр восстанавливается при запуске."""
+        return {'layer': self.layer_id, 'layer_tc': self.layer_tc_id, 'parameters': self.parameters}
+
+
+class ResultRegistry:
+    """Соответствие id слоя потребителей -> ResultEntry.
+
+    Дополнительно хранится обратный индекс id слоя потребителей или
+    поставщиков -> id слоев потребителей, чтобы при удалении слоя не
+    перебирать все записи.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = {}
+        self._by_layer = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries.values()))
+
+    def path_for(self, layer_id):
+        """Путь файла результатов для слоя потребителей; id слоя может содержать любые символы."""
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', layer_id) + RESULT_EXTENSION)
+
+    def scan(self):
+        """Заполнение реестра по заголовкам файлов в каталоге результатов."""
+        if not os.path.isdir(self.directory):
+            return
+        for file in os.listdir(self.directory):
+            if not file.endswith(RESULT_EXTENSION):
+                continue
+            path = os.path.join(self.directory, file)
+            try:
+                metadata = FlowMatrix.read_header(path)['metadata']
+                entry = ResultEntry(metadata['layer'], metadata['layer_tc'], path, metadata.get('parameters'))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            self._add(entry)
+
+    def register(self, layer_id, layer_tc_id, flows, parameters=None, line_layer_id=None, lines=None):
+        """Новая запись для слоя потребителей, заменяет предыдущую."""
+        self.remove(layer_id)
+        entry = ResultEntry(layer_id, layer_tc_id, self.path_for(layer_id), parameters, flows,
+                            line_layer_id, lines)
+        flows.metadata = entry.metadata()
+        self._add(entry)
+        return entry
+
+    def get(self, layer_id):
+        return self.entries.get(layer_id)
+
+    def remove(self, layer_id):
+        """Удаление записи слоя потребителей; возвращает удаленную запись или None."""
+        entry = self.entries.pop(layer_id, None)
+        if entry is not None:
+            for related_id in entry.layer_ids():
+                consumers = self._by_layer.get(related_id)
+                if consumers is not None:
+                    consumers.discard(layer_id)
+                    if not consumers:
+                        del self._by_layer[related_id]
+        return entry
+
+    def remove_layer(self, layer_id):
+        """Удаление всех записей, связанных со слоем; возвращает удаленные записи."""
+        return [self.remove(consumer_id) for consumer_id in list(self._by_layer.get(layer_id, ()))]
+
+    def _add(self, entry):
+        self.entries[entry.layer_id] = entry
+        for related_id in entry.layer_ids():
+            self._by_layer.setdefault(related_id, set()).add(entry.layer_id)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""KD-дерево для поиска соседей по массивам координат."""
+
+import heapq
+
+import numpy as np
+
+
+# максимальное число точек в листе дерева
+LEAF_SIZE = 32
+
+
+class KDTree:
+    """KD-дерево над точками формы (n, k).
+
+    Узлы хранятся в плоских списках: диапазон [start, end) в перестановке
+    self.index, ограничивающий прямоугольник и номера дочерних узлов
+    (-1 для листа). Все методы возвращают индексы точек в исходном массиве.
+
+    Если заданы веса точек weights, для каждого узла хранится наибольший вес
+    в нем (max_weight) - по нему nearest_heavier отсекает узлы без подходящих
+    точек. NaN считается меньше любого порога.
+    """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE, weights=None):
+        self.points = np.asarray(points, dtype=float)
+        if self.points.ndim == 1:
+            self.points = self.points[:, None]
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(self.points))
+        self.weights = None
+        if weights is not None:
+            self.weights = np.asarray(weights, dtype=float).copy()
+            self.weights[np.isnan(self.weights)] = -np.inf
+
+        self.start = []
+        self.end = []
+        self.low = []
+        self.high = []
+        self.left = []
+        self.right = []
+        self.max_weight = []
+        if len(self.points) != 0:
+            self._build()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _add_node(self, start, end):
+        pts = self.points[self.index[start:end]]
+        self.start.append(start)
+        self.end.append(end)
+        self.low.append(tuple(pts.min(axis=0).tolist()))
+        self.high.append(tuple(pts.max(axis=0).tolist()))
+        self.left.append(-1)
+        self.right.append(-1)
+        if self.weights is not None:
+            self.max_weight.append(float(self.weights[self.index[start:end]].max()))
+        return len(self.start) - 1
+
+    def _build(self):
+        stack = [self._add_node(0, len(self.points))]
+        while stack:
+            node = stack.pop()
+            start, end = self.start[node], self.end[node]
+            if end - start <= self.leaf_size:
+                continue
+
+            # делим по оси с наибольшим разбросом
+            spread = np.subtract(self.high[node], self.low[node])
+            dim = int(np.argmax(spread))
+            if spread[dim] == 0:
+                continue
+
+            mid = (start + end) // 2
+            idx = self.index[start:end]
+            order = np.argpartition(self.points[idx, dim], mid - start)
+            self.index[start:end] = idx[order]
+
+            self.left[node] = self._add_node(start, mid)
+            self.right[node] = self._add_node(mid, end)
+            stack.append(self.left[node])
+            stack.append(self.right[node])
+
+    def _min_distance2(self, node, point):
+        d2 = 0.0
+        for p, lo, hi in zip(point, self.low[node], self.high[node]):
+            if p < lo:
+                d2 += (lo - p) ** 2
+            elif p > hi:
+                d2 += (p - hi) ** 2
+        return d2
+
+    def _max_distance2(self, node, point):
+        d2 = 0.0
+        for p, lo, hi in zip(point, self.low[node], self.high[node]):
+            d2 += max(p - lo, hi - p) ** 2
+        return d2
+
+    def query_radius(self, point, r):
+        """Индексы точек на расстоянии не больше r от point."""
+        point = tuple(float(v) for v in np.ravel(point))
+        r2 = r * r
+        found = []
+        stack = [0] if self.start else []
+        while stack:
+            node = stack.pop()
+            if self._min_distance2(node, point) > r2:
+                continue
+            start, end = self.start[node], self.end[node]
+            if self._max_distance2(node, point) <= r2:
+                # узел целиком внутри радиуса
+                found.append(self.index[start:end])
+            elif self.left[node] == -1:
+                idx = self.index[start:end]
+                d2 = ((self.points[idx] - point) ** 2).sum(axis=1)
+                found.append(idx[d2 <= r2])
+            else:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+
+        if not found:
+            return np.empty(0, dtype=int)
+        return np.concatenate(found)
+
+    def query_radius_many(self, points, r):
+        """Пары (rows, cols): точка points[row] и точка дерева col в радиусе r."""
+        rows = []
+        cols = []
+        for i, point in enumerate(np.asarray(points, dtype=float)):
+            idx = self.query_radius(point, r)
+            rows.append(np.full(len(idx), i))
+            cols.append(idx)
+
+        if not rows:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(rows), np.concatenate(cols)
+
+    def nearest_heavier(self, point, threshold):
+        """Индекс ближайшей к point точки с весом больше threshold или -1.
+
+        Узлы просматриваются в порядке удаления от point, узлы с max_weight не
+        больше threshold пропускаются. Из равноудаленных точек выбирается точка
+        с меньшим индексом.
+        """
+        point = tuple(float(v) for v in np.ravel(point))
+        best = -1
+        best_d2 = np.inf
+        heap = [(0.0, 0)] if self.start else []
+        while heap:
+            d2, node = heapq.heappop(heap)
+            if d2 > best_d2:
+                break
+            if self.left[node] == -1:
+                idx = self.index[self.start[node]:self.end[node]]
+                idx = idx[self.weights[idx] > threshold]
+                if not len(idx):
+                    continue
+                leaf_d2 = ((self.points[idx] - point) ** 2).sum(axis=1)
+                nearest = leaf_d2.min()
+                i = int(idx[leaf_d2 == nearest].min())
+                if nearest < best_d2 or (nearest == best_d2 and i < best):
+                    best, best_d2 = i, nearest
+                continue
+            for child in (self.left[node], self.right[node]):
+                if self.max_weight[child] > threshold:
+                    child_d2 = self._min_distance2(child, point)
+                    if child_d2 <= best_d2:
+                        heapq.heappush(heap, (child_d2, child))
+        return best
+
+    def nearest_heavier_many(self, points, thresholds):
+        """nearest_heavier для каждой точки points со своим порогом."""
+        points = np.asarray(points, dtype=float)
+        if self.max_weight and len(points):
+            # точки, для которых подходящих соседей нет совсем, не ищем
+            found = np.asarray(thresholds, dtype=float) < self.max_weight[0]
+        else:
+            found = np.zeros(len(points), dtype=bool)
+        result = np.full(len(points), -1, dtype=np.int64)
+        for i in np.flatnonzero(found):
+            result[i] = self.nearest_heavier(points[i], thresholds[i])
+        return result
+
+    def _leaves_near(self, low, high, r2):
+        """Листы, ограничивающий прямоугольник которых ближе sqrt(r2) к прямоугольнику (low, high)."""
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            d2 = 0.0
+            for lo, hi, node_lo, node_hi in zip(low, high, self.low[node], self.high[node]):
+                gap = max(node_lo - hi, lo - node_hi, 0.0)
+                d2 += gap * gap
+            if d2 > r2:
+                continue
+            if self.left[node] == -1:
+                found.append(self.index[self.start[node]:self.end[node]])
+            else:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+        return np.concatenate(found)
+
+    def query_knn_all(self, k):
+        """k ближайших соседей каждой точки дерева, не считая ее саму.
+
+        Считается по листам: для точек листа сначала находится граница по
+        соседям внутри листа, затем расстояния до всех точек листов, которые
+        ближе этой границы, считаются одной матрицей.
+
+        :returns: массив (n, min(k, n - 1)) индексов по возрастанию расстояния.
+        """
+        n = len(self.points)
+        k = max(min(k, n - 1), 0)
+        result = np.empty((n, k), dtype=np.int64)
+        if k == 0:
+            return result
+        for node in range(len(self.start)):
+            if self.left[node] != -1:
+                continue
+            idx = self.index[self.start[node]:self.end[node]]
+            pts = self.points[idx]
+            if len(idx) > k:
+                own_d2 = ((pts[:, None, :] - pts[None, :, :]) ** 2).sum(axis=2)
+                bound = float(np.partition(own_d2, k, axis=1)[:, k].max())
+            else:
+                bound = np.inf
+            candidates = self._leaves_near(self.low[node], self.high[node], bound)
+            d2 = ((pts[:, None, :] - self.points[candidates][None, :, :]) ** 2).sum(axis=2)
+            d2[idx[:, None] == candidates[None, :]] = np.inf
+            if len(candidates) > k:
+                part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(len(candidates)), d2.shape)
+            part_d2 = np.take_along_axis(d2, part, axis=1)
+            part = candidates[part]
+            # по возрастанию расстояния, из равноудаленных - с меньшим индексом
+            order = np.lexsort((part, part_d2), axis=1)
+            result[idx] = np.take_along_axis(part, order, axis=1)
+        return result
@@ -26,7 +26,13 @@ import os
 from qgis.PyQt import uic
 from qgis.PyQt import QtWidgets
 from qgis.PyQt.QtCore import pyqtSignal, Qt
+import numpy as np
+from matplotlib import cm
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from matplotlib.patches import Wedge
+
+from .engine.gravity import LINES_THRESHOLD, LINES_TOP_K
 
 
 # This loads your .ui file so that PyQt can populate your plugin with the elements from Qt Designer
@@ -44,11 +50,140 @@ class GravityDialog(QtWidgets.QDialog, FORM_CLASS):
         self.setupUi(self)
         self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
 
+        self.comboBox_lines_mode.currentIndexChanged.connect(self.on_lines_mode_changed)
+        self.on_lines_mode_changed()
+
         self.plot_empty_chart()
 
+    def on_lines_mode_changed(self):
+        # параметры k и порога нужны только своим режимам вывода линий
+        self.spinBox_top_k.setEnabled(self.comboBox_lines_mode.currentIndex() == LINES_TOP_K)
+        self.doubleSpinBox_line_threshold.setEnabled(self.comboBox_lines_mode.currentIndex() == LINES_THRESHOLD)
+
     def plot_empty_chart(self):
-        canvas = FigureCanvas()
-        self.layout.addWidget(canvas)
+        # одна фигура и один холст на все время жизни окна: при смене выделения меняются только
+        # секторы и подписи, pyplot не используется и фигуры не накапливаются
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.ax.set_title('Распределение потребителей среди поставщиков', fontsize=10, pad=40)
+        self.ax.set(frame_on=False, xticks=[], yticks=[], xlim=(-1.25, 1.25), ylim=(-1.25, 1.25))
+        self.ax.set_aspect('equal')
+        self.figure.subplots_adjust(top=0.77, bottom=0.15, left=0.0, right=1)
+        self.wedges = []
+        self.annotations = []
+        # секторы и подписи анимированные: обычная перерисовка холста их не рисует, фон без них
+        # сохраняется после каждой полной перерисовки, выделение рисуется поверх фона (blitting)
+        self.background = None
+        self.highlighted = None
+        self.canvas.mpl_connect('draw_event', self.on_chart_draw)
+        self.canvas.mpl_connect('button_press_event', self.on_chart_click)
+        self.layout.addWidget(self.canvas)
+
+    def plot_distribution(self, distribution):
+        """Кольцевая диаграмма долей: distribution - словарь подпись -> вероятность.
+
+        Секторы и подписи предыдущей диаграммы переиспользуются, лишние удаляются,
+        недостающие создаются.
+        """
+        values = np.array(list(distribution.values()), dtype=float)
+        colors = cm.tab10(np.arange(len(values)) % 10)
+        bounds = 90 + 360 * np.concatenate([[0], np.cumsum(values)]) / values.sum()
+
+        while len(self.wedges) > len(values):
+            self.wedges.pop().remove()
+            self.annotations.pop().remove()
+
+        for i, (category, value) in enumerate(distribution.items()):
+            theta1, theta2 = bounds[i], bounds[i + 1]
+            angle_rad = np.deg2rad((theta1 + theta2) / 2)
+            xy = (1.1 * np.cos(angle_rad), 1.1 * np.sin(angle_rad))
+            xytext = (1.5 * np.cos(angle_rad), 1.5 * np.sin(angle_rad))
+
+            label = str(category)
+            if len(label) > 19:
+                label = label[:18]+'…'
+            text = '{:.1f}%\n{}'.format(value * 100, label)
+
+            if i < len(self.wedges):
+                wedge = self.wedges[i]
+                wedge.set_theta1(theta1)
+                wedge.set_theta2(theta2)
+                annotation = self.annotations[i]
+                annotation.set_text(text)
+                annotation.xy = xy
+                annotation.set_position(xytext)
+                annotation.arrow_patch.set_color(colors[i])
+            else:
+                # сектор - кольцо шириной 0.5: отверстие в центре не зависит от порядка отрисовки
+                # анимированных секторов поверх фона
+                wedge = Wedge((0, 0), 1, theta1, theta2, width=0.5, animated=True)
+                self.ax.add_patch(wedge)
+                self.wedges.append(wedge)
+                annotation = self.ax.annotate(text, xy=xy, xytext=xytext,
+                                              ha='center', va='center', fontsize=10, color='white',
+                                              arrowprops=dict(arrowstyle='-', color=colors[i]),
+                                              bbox=dict(boxstyle="round,pad=0.2", fc=colors[i], alpha=1.0, edgecolor='none'),
+                                              animated=True)
+                self.annotations.append(annotation)
+
+            wedge.set_facecolor(colors[i])
+            wedge.set_edgecolor('white')
+            self.set_highlight(i, None)
+
+        self.highlighted = None
+        self.canvas.draw_idle()
+
+    def on_chart_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in sorted(self.wedges + self.annotations, key=lambda artist: artist.get_zorder()):
+            self.figure.draw_artist(artist)
+
+    def set_highlight(self, i, highlighted):
+        """Прозрачность сектора и подписи i: выделенный (или все, если highlighted is None)
+        непрозрачны и выделенный обведен толще, остальные приглушены."""
+        alpha = 1 if highlighted is None or i == highlighted else 0.35
+        annotation = self.annotations[i]
+        annotation.set_alpha(alpha)
+        annotation.set_zorder(12 if i == highlighted else 3)
+        annotation.get_bbox_patch().set_alpha(alpha)
+        wedge = self.wedges[i]
+        wedge.set_alpha(alpha)
+        wedge.set_linewidth(2 if i == highlighted else 1)
+
+    def wedge_at(self, x, y):
+        """Номер сектора под точкой (x, y) в координатах диаграммы или None."""
+        # угол клика от центра диаграммы, приведенный к диапазону секторов [90, 450)
+        angle = np.degrees(np.arctan2(y, x)) % 360
+        if angle < 90:
+            angle += 360
+        distance = np.hypot(x, y)
+        for i, wedge in enumerate(self.wedges):
+            if wedge.theta1 <= angle <= wedge.theta2 and distance <= wedge.r + 1:
+                return i
+        return None
+
+    def on_chart_click(self, event):
+        highlighted = None
+        if event.inaxes == self.ax:
+            highlighted = self.wedge_at(event.xdata, event.ydata)
+        if highlighted == self.highlighted:
+            # выделение не изменилось - перерисовывать нечего
+            return
+        self.highlighted = highlighted
+        for i in range(len(self.wedges)):
+            self.set_highlight(i, highlighted)
+
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        # восстанавливаем сохраненный фон и рисуем поверх только секторы и подписи
+        self.canvas.restore_region(self.background)
+        self.draw_animated()
+        self.canvas.blit(self.figure.bbox)
 
     def closeEvent(self, event):
         # Добавьте ваш код обработки закрытия диалогового окна здесь
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Фоновая задача расчета гравитационной модели."""
+
+import numpy as np
+from qgis.PyQt.QtCore import QCoreApplication, QVariant
+from qgis.core import QgsTask, QgsVectorLayer, QgsField
+
+from .engine.flow_matrix import FlowMatrix
+from .engine.geometry import linestring_wkb
+from .engine.gravity import BLOCK_SIZE, gravity_blocks, line_mask
+from .layer_snapshot import add_features, snapshot_layer
+
+
+# доля прогресса, отводимая на расчет матрицы; остальное - построение линий
+MATRIX_PROGRESS = 80
+
+
+class GravityTask(QgsTask):
+    """Расчет вероятностей и линий потоков вне потока интерфейса.
+
+    Слои читаются в run() через LayerSource, созданные в основном потоке, сам
+    слой из потока задачи не используется. Матрица считается блоками
+    потребителей исполнителем backend (см. engine.parallel), после каждого
+    блока обновляется прогресс и проверяется отмена. finished() вызывается в
+    основном потоке и передает задачу в on_finished(task, result), где слои
+    добавляются в проект.
+    """
+
+    def __init__(self, source, tc_source, parameters, crs_authid, on_finished, backend=None):
+        super().__init__('Гравитационная модель', QgsTask.CanCancel)
+        self.source = source
+        self.tc_source = tc_source
+        self.parameters = parameters
+        self.crs_authid = crs_authid
+        self.on_finished = on_finished
+        self.backend = backend
+
+        self.skipped = 0
+        self.flows = None
+        self.line_layer = None
+        self.lines = None
+        self.exception = None
+
+    def run(self):
+        try:
+            return self.compute()
+        except Exception as e:
+            self.exception = e
+            return False
+
+    def compute(self):
+        parameters = self.parameters
+
+        # координаты и значимость - одним проходом по каждому слою
+        tc_snapshot = snapshot_layer(self.tc_source, [parameters['layer_tc_attr']])
+        f_snapshot = snapshot_layer(self.source)
+        self.skipped = f_snapshot.skipped + tc_snapshot.skipped
+        if self.isCanceled():
+            return False
+        self.f_ids, self.f_lat, self.f_long = f_snapshot.ids, f_snapshot.y, f_snapshot.x
+        self.tc_ids, self.tc_lat, self.tc_long = tc_snapshot.ids, tc_snapshot.y, tc_snapshot.x
+        self.tc_significance = tc_snapshot.column(parameters['layer_tc_attr'])
+        n = len(self.f_ids)
+
+        f_rows = [np.empty(0, dtype=int)]
+        tc_cols = [np.empty(0, dtype=int)]
+        values = [np.empty(0)]
+        blocks = gravity_blocks(self.f_lat, self.f_long, self.tc_lat, self.tc_long, self.tc_significance,
+                                parameters['alpha'], parameters['beta'], parameters['max_distance'], backend=self.backend)
+        for start, rows, cols, probabilities in blocks:
+            if self.isCanceled():
+                # закрытие генератора снимает оставшиеся блоки пула и освобождает разделяемую память
+                blocks.close()
+                return False
+            f_rows.append(rows)
+            tc_cols.append(cols)
+            values.append(probabilities)
+            self.setProgress(MATRIX_PROGRESS * min(start + BLOCK_SIZE, n) / max(n, 1))
+
+        f_rows = np.concatenate(f_rows)
+        tc_cols = np.concatenate(tc_cols)
+        values = np.concatenate(values)
+
+        # разреженная матрица вероятностей: хранятся только ненулевые потоки
+        self.flows = FlowMatrix.from_pairs(self.f_ids, self.tc_ids, f_rows, tc_cols, values)
+
+        # линии от потребителя к поставщикам в радиусе max_distance (все, k наиболее вероятных
+        # или выше порога)
+        selected = line_mask(f_rows, values, n, parameters['lines_mode'], parameters['top_k'], parameters['line_threshold'])
+        f_rows, tc_cols, values = f_rows[selected], tc_cols[selected], values[selected]
+
+        line_layer = QgsVectorLayer('LineString?crs=' + self.crs_authid, 'линии [g. m.]', 'memory')
+        line_layer.dataProvider().addAttributes([QgsField('f_id', QVariant.Int), QgsField('tc_id', QVariant.Int), QgsField('probability', QVariant.Double)])
+        line_layer.updateFields()
+        line_ids = self.add_line_features(line_layer,
+                                          self.f_long[f_rows], self.f_lat[f_rows], self.tc_long[tc_cols], self.tc_lat[tc_cols],
+                                          [self.f_ids[f_rows], self.tc_ids[tc_cols], values])
+        if line_ids is None:
+            return False
+
+        # индекс линий по строкам матрицы для выделения на диаграмме: линии потребителя
+        # из строки i - line_ids[line_indptr[i]:line_indptr[i + 1]]
+        line_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(f_rows, minlength=n), out=line_indptr[1:])
+        self.lines = (line_indptr, line_ids)
+
+        # слой создан в потоке задачи, передаем его основному потоку
+        line_layer.moveToThread(QCoreApplication.instance().thread())
+        self.line_layer = line_layer
+        return True
+
+    def add_line_features(self, line_layer, x1, y1, x2, y2, columns):
+        """Добавляет в слой отрезки (x1, y1) - (x2, y2) с атрибутами из массивов columns.
+
+        Геометрии строятся из WKB, подготовленного сразу для всех отрезков, объекты
+        передаются провайдеру пакетами через add_features. Возвращает id добавленных
+        объектов или None, если задача отменена.
+        """
+        wkbs = linestring_wkb(x1, y1, x2, y2)
+        total = max(len(wkbs), 1)
+
+        def progress(added):
+            self.setProgress(MATRIX_PROGRESS + (100 - MATRIX_PROGRESS) * added / total)
+
+        line_ids = add_features(line_layer, wkbs, zip(*(column.tolist() for column in columns)),
+                                is_canceled=self.isCanceled, progress=progress)
+        if line_ids is None:
+            return None
+        return np.array(line_ids, dtype=np.int64)
+
+    def finished(self, result):
+        self.on_finished(self, result)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Обмен данными между слоями QGIS и массивами NumPy."""
+
+import numpy as np
+from qgis.core import NULL, QgsFeature, QgsFeatureRequest, QgsFields, QgsGeometry, QgsVectorLayerFeatureSource, QgsWkbTypes
+
+
+# число объектов, передаваемых провайдеру слоя за один вызов addFeatures
+FEATURE_BATCH = 50000
+
+
+class LayerSource:
+    """Источник объектов слоя для чтения из других потоков.
+
+    Создается в основном потоке: QgsVectorLayerFeatureSource копирует
+    состояние слоя (провайдер, буфер редактирования), поля копируются
+    отдельно. После этого слой из рабочих потоков не используется, а каждый
+    поток или задача читает через свой LayerSource. Методы повторяют
+    QgsVectorLayer, поэтому snapshot_layer принимает и слой, и источник.
+    """
+
+    def __init__(self, layer):
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self._fields = QgsFields(layer.fields())
+
+    def fields(self):
+        return self._fields
+
+    def getFeatures(self, request=None):
+        return self.source.getFeatures(request or QgsFeatureRequest())
+
+
+class LayerSnapshot:
+    """Id объектов, координаты x/y и выбранные атрибуты точечного слоя.
+
+    Строки массивов соответствуют объектам в порядке чтения слоя, columns -
+    словарь имя поля -> массив float (NULL и нечисловые значения - NaN).
+    skipped - число объектов без точечной геометрии, не вошедших в снимок.
+    """
+
+    def __init__(self, ids, x, y, columns=None, skipped=0):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.columns = dict(columns or {})
+        self.skipped = skipped
+
+    def __len__(self):
+        return len(self.ids)
+
+    def column(self, name):
+        return self.columns[name]
+
+
+def _to_float(value):
+    if value == NULL or value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def snapshot_layer(layer, attributes=()):
+    """Однократное чтение точечного слоя или LayerSource.
+
+    Запрашиваются только геометрия и поля attributes, объекты без точечной
+    геометрии пропускаются. Вне основного потока читать можно только через
+    LayerSource.
+    """
+    fields = layer.fields()
+    attributes = list(attributes)
+    indices = [fields.indexFromName(name) for name in attributes]
+    request = QgsFeatureRequest().setSubsetOfAttributes(indices)
+
+    ids = []
+    x = []
+    y = []
+    values = [[] for _ in attributes]
+    skipped = 0
+    for f in layer.getFeatures(request):
+        geometry = f.geometry()
+        if geometry is None or geometry.isNull() or geometry.type() != QgsWkbTypes.PointGeometry or geometry.isMultipart():
+            skipped += 1
+            continue
+        point = geometry.asPoint()
+        ids.append(f.id())
+        x.append(point.x())
+        y.append(point.y())
+        for column, index in zip(values, indices):
+            column.append(_to_float(f.attribute(index)))
+
+    columns = {name: np.array(column, dtype=float) for name, column in zip(attributes, values)}
+    return LayerSnapshot(ids, x, y, columns, skipped)
+
+
+def write_column(layer, name, ids, values):
+    """Запись значений поля name объектам ids одним вызовом провайдера.
+
+    Изменения передаются changeAttributeValues без сеанса редактирования,
+    поэтому файловые и серверные слои не переписываются по объекту.
+    """
+    index = layer.fields().indexFromName(name)
+    changes = {f_id: {index: value} for f_id, value in zip(np.asarray(ids).tolist(), np.asarray(values).tolist())}
+    ok = layer.dataProvider().changeAttributeValues(changes)
+    layer.triggerRepaint()
+    return ok
+
+
+def add_features(layer, geometries, attributes, is_canceled=None, progress=None):
+    """Добавление объектов со схемой слоя пакетами по FEATURE_BATCH.
+
+    geometries - QgsGeometry или WKB (bytes), attributes - списки значений в
+    порядке полей слоя. Перед каждым пакетом вызывается is_canceled(), после
+    него - progress(число добавленных объектов). Возвращает id добавленных
+    объектов или None, если добавление отменено.
+    """
+    provider = layer.dataProvider()
+    fields = layer.fields()
+    added_ids = []
+    batch = []
+
+    def flush():
+        if is_canceled is not None and is_canceled():
+            return False
+        added_ids.extend(f.id() for f in provider.addFeatures(batch)[1])
+        if progress is not None:
+            progress(len(added_ids))
+        return True
+
+    for geometry, values in zip(geometries, attributes):
+        if isinstance(geometry, bytes):
+            wkb = geometry
+            geometry = QgsGeometry()
+            geometry.fromWkb(wkb)
+        feature = QgsFeature(fields)
+        feature.setGeometry(geometry)
+        feature.setAttributes(list(values))
+        batch.append(feature)
+        if len(batch) == FEATURE_BATCH:
+            if not flush():
+                return None
+            batch = []
+    if batch and not flush():
+        return None
+    return added_ids
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Сравнение способов выполнения ядер engine на случайных данных.
+
+Запуск из корня плагина: python scripts/benchmark_backends.py [число точек]
+Печатает время гравитационной модели и поиска nearest_heavier для
+последовательного расчета и пула процессов с разным числом процессов.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.centers import nearest_heavier, significance_thresholds  # noqa: E402
+from engine.gravity import gravity_blocks  # noqa: E402
+from engine.parallel import BACKEND_PROCESS, BACKEND_SERIAL, make_backend  # noqa: E402
+
+
+def gravity(backend, n):
+    rng = np.random.default_rng(1)
+    args = (rng.uniform(55, 56, n), rng.uniform(37, 38, n),
+            rng.uniform(55, 56, n // 10), rng.uniform(37, 38, n // 10), rng.uniform(10, 1000, n // 10),
+            1.0, 2.0, 5000)
+    for _ in gravity_blocks(*args, backend=backend):
+        pass
+
+
+def centers(backend, n):
+    rng = np.random.default_rng(2)
+    weights = rng.pareto(1.5, n) * 100
+    nearest_heavier(rng.uniform(0, 1e5, n), rng.uniform(0, 1e5, n), weights,
+                    significance_thresholds(weights, 1.5), backend)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    cpus = os.cpu_count() or 1
+    print(f'точек: {n}, процессоров: {cpus}')
+    runs = [('последовательно', BACKEND_SERIAL, None)]
+    runs += [(f'процессов: {workers}', BACKEND_PROCESS, workers) for workers in sorted({2, cpus}) if workers > 1]
+    for name, kernel in (('гравитационная модель', gravity), ('nearest_heavier', centers)):
+        for label, kind, workers in runs:
+            start = time.perf_counter()
+            kernel(make_backend(kind, workers), n)
+            print(f'{name:<24}{label:<18}{time.perf_counter() - start:8.2f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Стили слоев результатов с цветом из небольшой палитры."""
+
+from qgis.core import QgsProperty, QgsSingleSymbolRenderer, QgsSymbol, QgsSymbolLayer, QgsWkbTypes
+
+
+# палитра для раскраски по центрам; номер цвета хранится в атрибуте объекта
+PALETTE = (
+    '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b',
+    '#e377c2', '#7f7f7f', '#bcbd22', '#17becf', '#393b79', '#ad494a',
+)
+
+
+def palette_expression(field):
+    """Выражение QGIS: цвет палитры по номеру из поля field."""
+    colors = ', '.join(f"'{color}'" for color in PALETTE)
+    return f'array_get(array({colors}), "{field}" % {len(PALETTE)})'
+
+
+def palette_renderer(layer, field):
+    """Один символ с цветом, заданным через данные (data-defined) из поля field.
+
+    В отличие от категорий по каждому центру, создание стиля и отрисовка не
+    зависят от числа центров.
+    """
+    symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+    color = QgsProperty.fromExpression(palette_expression(field))
+    for symbol_layer in symbol.symbolLayers():
+        if layer.geometryType() == QgsWkbTypes.LineGeometry:
+            symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyStrokeColor, color)
+        else:
+            symbol_layer.setDataDefinedProperty(QgsSymbolLayer.PropertyFillColor, color)
+    return QgsSingleSymbolRenderer(symbol)
@@ -0,0 +1,145 @@
+# coding=utf-8
+"""Central places model engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import unittest
+
+import numpy as np
+
+from engine.centers import (center_edges, center_hierarchy, center_members, connect_points, greedy_coloring, nearest_heavier,
+                            resolve_centers, significance_thresholds)
+
+
+def reference_connections(x, y, significance, multiplier, stop):
+    """Connections exactly as the original per-feature search chose them."""
+    to = []
+    for i, s in enumerate(significance):
+        population = int(s)
+        if population > stop:
+            to.append(i)
+            continue
+        candidates = [j for j, other in enumerate(significance) if other > population * multiplier]
+        if not candidates:
+            to.append(i)
+            continue
+        to.append(min(candidates, key=lambda j: ((x[j] - x[i]) ** 2 + (y[j] - y[i]) ** 2, j)))
+    return to
+
+
+class CentersTest(unittest.TestCase):
+    """Test the nearest more significant neighbour search."""
+
+    def test_matches_loop(self):
+        """Test connections reproduce the per-feature search."""
+        rng = np.random.default_rng(11)
+        x, y = rng.uniform(0, 100, 400), rng.uniform(0, 100, 400)
+        significance = rng.uniform(1, 5000, 400)
+        nearest = nearest_heavier(x, y, significance, significance_thresholds(significance, 1.5))
+        for stop in (1000, 4000):
+            self.assertEqual(connect_points(significance, nearest, stop).tolist(),
+                             reference_connections(x, y, significance, 1.5, stop))
+
+    def test_missing_significance(self):
+        """Test points without significance are never chosen as targets."""
+        nearest = nearest_heavier([0, 1, 2], [0, 0, 0], [np.nan, 10, 5], [0, 0, 1])
+        self.assertEqual(nearest.tolist(), [1, 1, 2])
+
+    def test_missing_own_significance(self):
+        """Test a point without significance joins its nearest point instead of becoming a center."""
+        significance = np.array([100, np.nan, 5, 6])
+        thresholds = significance_thresholds(significance, 1)
+        self.assertEqual(thresholds.tolist(), [100, 0, 5, 6])
+        nearest = nearest_heavier([0, 1, 2, 3], [0, 0, 0, 0], significance, thresholds)
+        to, center, level, parent = center_hierarchy(significance, nearest, [50, 10])
+        self.assertEqual(to.tolist(), [0, 0, 3, 0])
+        self.assertEqual(level.tolist(), [1, 0, 0, 0])
+        self.assertEqual(center.tolist(), [0, 0, 0, 0])
+
+    def test_resolve_centers(self):
+        """Test chains resolve to their center and cycles stay unassigned."""
+        to = [0, 0, 1, 2, 4, 3, 7, 6]
+        self.assertEqual(resolve_centers(to).tolist(), [0, 0, 0, 0, 4, 0, -1, -1])
+
+    def test_center_members(self):
+        """Test members are grouped by center with the center first."""
+        center_rows, order, indptr = center_members([2, 2, 2, -1, 4, 2])
+        self.assertEqual(center_rows.tolist(), [2, 4])
+        self.assertEqual(order[indptr[0]:indptr[1]].tolist(), [2, 0, 1, 5])
+        self.assertEqual(order[indptr[1]:indptr[2]].tolist(), [4])
+
+    def test_long_chain(self):
+        """Test a single chain through every point resolves to its end."""
+        to = np.arange(-1, 100000)
+        to[0] = 0
+        self.assertTrue(np.all(resolve_centers(to) == 0))
+
+    def test_hierarchy(self):
+        """Test every level matches a separate single-threshold run."""
+        rng = np.random.default_rng(3)
+        x, y = rng.uniform(0, 100, 300), rng.uniform(0, 100, 300)
+        significance = rng.pareto(1.5, 300) * 100
+        nearest = nearest_heavier(x, y, significance, significance_thresholds(significance, 2))
+        stops = [50, 500, 200]
+        to, center, level, parent = center_hierarchy(significance, nearest, stops)
+
+        rows = np.arange(300)
+        levels = [resolve_centers(connect_points(significance, nearest, stop)) for stop in sorted(stops, reverse=True)]
+        np.testing.assert_array_equal(center, levels[-1])
+        np.testing.assert_array_equal(to, connect_points(significance, nearest, 50))
+        for k, level_center in enumerate(levels, 1):
+            is_center = level_center == rows
+            self.assertTrue(np.all(level[is_center] >= 1) and np.all(level[is_center] <= k))
+            if k > 1:
+                new = level == k
+                np.testing.assert_array_equal(parent[new], levels[k - 2][new])
+        np.testing.assert_array_equal(parent[level == 0], center[level == 0])
+        self.assertTrue(np.all(parent[level == 1] == -1))
+
+    def test_hierarchy_without_stops(self):
+        """Test an empty threshold list is rejected instead of making every point a center."""
+        self.assertRaises(ValueError, center_hierarchy, np.ones(3), np.full(3, -1), [])
+
+    def test_center_edges(self):
+        """Test centers are adjacent when a member has a nearest point of another center."""
+        x = np.array([0, 1, 2, 3, 10, 11, 30])
+        y = np.zeros(7)
+        center = np.array([0, 0, 2, 2, 4, 4, -1])
+        self.assertEqual(center_edges(x, y, center, 1).tolist(), [[0, 2]])
+        self.assertEqual(center_edges(x, y, center, 2).tolist(), [[0, 2], [2, 4]])
+        self.assertEqual(center_edges(x[:2], y[:2], center[:2], 1).shape, (0, 2))
+
+    def test_coloring(self):
+        """Test adjacent market areas get different palette colours."""
+        rng = np.random.default_rng(9)
+        x, y = rng.uniform(0, 100, 3000), rng.uniform(0, 100, 3000)
+        significance = rng.pareto(1.5, 3000) * 100
+        nearest = nearest_heavier(x, y, significance, significance_thresholds(significance, 2))
+        center = resolve_centers(connect_points(significance, nearest, 200))
+        center_rows = np.unique(center)
+        edges = center_edges(x, y, center, 4)
+        self.assertTrue(len(edges) > 0 and np.all(edges[:, 0] < edges[:, 1]))
+        edges = np.searchsorted(center_rows, edges)
+        colors = greedy_coloring(len(center_rows), edges, 12)
+        self.assertTrue(np.all((colors >= 0) & (colors < 12)))
+        self.assertFalse(np.any(colors[edges[:, 0]] == colors[edges[:, 1]]))
+
+    def test_coloring_palette_exhausted(self):
+        """Test a clique larger than the palette still gets valid colours."""
+        edges = [(a, b) for a in range(5) for b in range(a + 1, 5)]
+        colors = greedy_coloring(5, edges, 3)
+        self.assertTrue(np.all(colors < 3))
+        self.assertEqual(sorted(np.bincount(colors).tolist()), [1, 2, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
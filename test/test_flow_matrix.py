@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Sparse flow matrix test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import csv
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from engine.flow_matrix import FlowMatrix
+
+
+class FlowMatrixTest(unittest.TestCase):
+    """Test the CSR flow matrix and its storage."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dense = np.array([[0.25, 0, 0.75],
+                               [0, 0, 0],
+                               [0, 1.0, 0]])
+        rows, cols = np.nonzero(np.ones_like(self.dense))
+        self.flows = FlowMatrix.from_pairs([10, 11, 12], [1, 2, 3], rows, cols, self.dense[rows, cols])
+        self.tmp = tempfile.mkdtemp()
+
+    def test_only_nonzero_values_are_stored(self):
+        """Test zeros are dropped and the dense matrix is restored."""
+        self.assertEqual(self.flows.nnz, 3)
+        np.testing.assert_array_equal(self.flows.to_dense(), self.dense)
+
+    def test_rows_and_column_sums(self):
+        """Test row lookup by consumer id and column sums."""
+        cols, values = self.flows.row_by_id(10)
+        self.assertEqual(cols.tolist(), [0, 2])
+        self.assertEqual(values.tolist(), [0.25, 0.75])
+        self.assertEqual(len(self.flows.row_by_id(11)[0]), 0)
+        self.assertEqual(len(self.flows.row_by_id(99)[0]), 0)
+        np.testing.assert_array_equal(self.flows.column_sums(), [0.25, 1.0, 0.75])
+
+    def test_row_index(self):
+        """Test consumer id lookup for sorted and unsorted ids."""
+        self.assertEqual([self.flows.row_index(f_id) for f_id in (10, 11, 12, 9, 13)], [0, 1, 2, -1, -1])
+        flows = FlowMatrix.from_pairs([30, 10, 20], [1], [0, 2], [0, 0], [0.5, 1.0])
+        self.assertEqual([flows.row_index(f_id) for f_id in (10, 20, 30, 15)], [1, 2, 0, -1])
+        self.assertEqual(flows.row_by_id(20)[1].tolist(), [1.0])
+
+    def test_save_and_load(self):
+        """Test the matrix survives a save/load round trip through the binary file."""
+        path = os.path.join(self.tmp, 'flows.gmb')
+        self.flows.save(path)
+        loaded = FlowMatrix.load(path)
+        self.assertIsInstance(loaded.data.base, np.memmap)
+        np.testing.assert_array_equal(loaded.row_ids, [10, 11, 12])
+        np.testing.assert_array_equal(loaded.col_ids, [1, 2, 3])
+        np.testing.assert_array_equal(loaded.to_dense(), self.dense)
+        self.assertEqual(loaded.row_by_id(12)[1].tolist(), [1.0])
+
+    def test_save_empty(self):
+        """Test a matrix without flows can be stored."""
+        path = os.path.join(self.tmp, 'empty.gmb')
+        FlowMatrix.from_pairs([1, 2], [5], [], [], []).save(path)
+        loaded = FlowMatrix.load(path)
+        self.assertEqual(loaded.shape, (2, 1))
+        self.assertEqual(loaded.nnz, 0)
+
+    def test_load_rejects_other_files(self):
+        """Test a file that is not a result file is refused."""
+        path = os.path.join(self.tmp, 'flows.csv')
+        self.flows.write_csv(path)
+        self.assertRaises(ValueError, FlowMatrix.load, path)
+
+    def test_write_csv(self):
+        """Test the dense CSV export layout."""
+        path = os.path.join(self.tmp, 'flows.csv')
+        self.flows.write_csv(path)
+        with open(path) as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[0], ['f', '1', '2', '3'])
+        self.assertEqual(rows[1], ['10', '0.25', '0', '0.75'])
+        self.assertEqual(rows[2], ['11', '0', '0', '0'])
+
+    def test_csv_round_trip(self):
+        """Test the CSV converter reads back what it writes."""
+        path = os.path.join(self.tmp, 'flows.csv')
+        self.flows.write_csv(path)
+        converted = FlowMatrix.read_csv(path)
+        np.testing.assert_array_equal(converted.row_ids, self.flows.row_ids)
+        np.testing.assert_array_equal(converted.col_ids, self.flows.col_ids)
+        np.testing.assert_array_equal(converted.to_dense(), self.dense)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# coding=utf-8
+"""WKB geometry builder test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import struct
+import unittest
+
+import numpy as np
+
+from engine.geometry import convex_hulls, linestring_wkb, point_wkb, polygon_wkb
+
+
+class GeometryTest(unittest.TestCase):
+    """Test WKB built from coordinate arrays."""
+
+    def test_point_wkb(self):
+        """Test each point is a little-endian 2D WKB Point."""
+        wkbs = point_wkb(np.array([0.5, 3.0]), np.array([1.0, -2.0]))
+        self.assertEqual(len(wkbs), 2)
+        self.assertEqual(struct.unpack('<BI2d', wkbs[0]), (1, 1, 0.5, 1.0))
+        self.assertEqual(struct.unpack('<BI2d', wkbs[1]), (1, 1, 3.0, -2.0))
+
+    def test_linestring_wkb(self):
+        """Test each segment is a little-endian 2D WKB LineString."""
+        wkbs = linestring_wkb(np.array([0.0, 1.5]), np.array([1.0, 2.5]), np.array([3.0, 4.5]), np.array([5.0, 6.5]))
+        self.assertEqual(len(wkbs), 2)
+        self.assertEqual(struct.unpack('<BII4d', wkbs[0]), (1, 2, 2, 0.0, 1.0, 3.0, 5.0))
+        self.assertEqual(struct.unpack('<BII4d', wkbs[1]), (1, 2, 2, 1.5, 2.5, 4.5, 6.5))
+
+    def test_linestring_wkb_empty(self):
+        """Test no segments give no geometries."""
+        self.assertEqual(linestring_wkb(np.empty(0), np.empty(0), np.empty(0), np.empty(0)), [])
+
+    def test_convex_hulls(self):
+        """Test hulls per group, skipping unassigned points."""
+        x = np.array([0, 2, 2, 0, 1, 5, 6, 7, 9, 10, 10])
+        y = np.array([0, 0, 2, 2, 1, 5, 6, 7, 9, 9, 8])
+        labels = np.array([3, 3, 3, 3, 3, 7, 7, 7, -1, 1, 1])
+        hull_labels, indptr, hull_x, hull_y = convex_hulls(x, y, labels, pad=0.5)
+        self.assertEqual(hull_labels.tolist(), [1, 3, 7])
+        self.assertEqual(indptr.tolist(), [0, 4, 8, 12])
+        self.assertEqual(list(zip(hull_x[4:8].tolist(), hull_y[4:8].tolist())), [(0, 0), (2, 0), (2, 2), (0, 2)])
+
+    def test_convex_hulls_degenerate(self):
+        """Test groups of one or two points and collinear groups get a padded rectangle."""
+        x = np.array([10, 10, 5, 6, 7, 3])
+        y = np.array([9, 8, 5, 6, 7, 3])
+        labels = np.array([1, 1, 7, 7, 7, 4])
+        hull_labels, indptr, hull_x, hull_y = convex_hulls(x, y, labels, pad=0.5)
+        self.assertEqual(hull_labels.tolist(), [1, 4, 7])
+        rings = [list(zip(hull_x[a:b].tolist(), hull_y[a:b].tolist())) for a, b in zip(indptr[:-1], indptr[1:])]
+        self.assertEqual(rings[0], [(9.5, 7.5), (10.5, 7.5), (10.5, 9.5), (9.5, 9.5)])
+        self.assertEqual(rings[1], [(2.5, 2.5), (3.5, 2.5), (3.5, 3.5), (2.5, 3.5)])
+        self.assertEqual(rings[2], [(4.5, 4.5), (7.5, 4.5), (7.5, 7.5), (4.5, 7.5)])
+
+    def test_polygon_wkb(self):
+        """Test each ring is closed and written as a single-ring WKB Polygon."""
+        wkbs = polygon_wkb(np.array([0, 3]), np.array([0.0, 1.0, 0.0]), np.array([0.0, 0.0, 1.0]))
+        self.assertEqual(len(wkbs), 1)
+        self.assertEqual(struct.unpack('<BIII8d', wkbs[0]), (1, 3, 1, 4, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 0.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Gravity model engine test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import math
+import unittest
+
+import numpy as np
+
+from engine.gravity import LINES_ALL, LINES_THRESHOLD, LINES_TOP_K, gravity_blocks, haversine, line_mask
+
+
+def reference_distance(lat1, lon1, lat2, lon2):
+    """Scalar haversine used by the original per-pair loop."""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a)) * 1000
+
+
+def reference_probabilities(f_coords, tc_coords, significance, alpha, beta, max_distance):
+    """Row probabilities exactly as the original nested loop computed them."""
+    data = []
+    for f_lat, f_lon in f_coords:
+        h = []
+        for (tc_lat, tc_lon), s in zip(tc_coords, significance):
+            distance = reference_distance(f_lat, f_lon, tc_lat, tc_lon)
+            h.append(0 if distance > max_distance else s ** alpha / distance ** beta)
+        total = sum(h)
+        data.append([round(v / total, 4) if total != 0 else 0 for v in h])
+    return np.array(data)
+
+
+class GravityEngineTest(unittest.TestCase):
+    """Test the vectorized gravity kernel against the per-pair loop."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(42)
+        self.f_coords = np.column_stack([rng.uniform(55, 56, 60), rng.uniform(37, 38, 60)])
+        self.tc_coords = np.column_stack([rng.uniform(55, 56, 15), rng.uniform(37, 38, 15)])
+        self.significance = rng.uniform(10, 1000, 15)
+
+    def test_haversine_matches_scalar(self):
+        """Test the distance matrix matches the scalar formula."""
+        distance = haversine(self.f_coords[:, 0, None], self.f_coords[:, 1, None],
+                             self.tc_coords[None, :, 0], self.tc_coords[None, :, 1])
+        for i, (f_lat, f_lon) in enumerate(self.f_coords):
+            for j, (tc_lat, tc_lon) in enumerate(self.tc_coords):
+                self.assertAlmostEqual(distance[i, j], reference_distance(f_lat, f_lon, tc_lat, tc_lon), places=5)
+
+    def run_blocks(self, *args, **kwargs):
+        """Collect block results into a dense matrix and the pairs in range."""
+        matrix = np.zeros((len(args[0]), len(args[2])))
+        pairs = []
+        for start, rows, cols, probabilities in gravity_blocks(*args, **kwargs):
+            self.assertTrue(np.all(rows >= start))
+            matrix[rows, cols] = probabilities
+            pairs.extend(zip(rows.tolist(), cols.tolist()))
+        return matrix, pairs
+
+    def test_probabilities_match_loop(self):
+        """Test block results reproduce the original probabilities."""
+        alpha, beta, max_distance = 1.5, 2.0, 30000
+        expected = reference_probabilities(self.f_coords, self.tc_coords, self.significance,
+                                           alpha, beta, max_distance)
+        matrix, _ = self.run_blocks(self.f_coords[:, 0], self.f_coords[:, 1],
+                                    self.tc_coords[:, 0], self.tc_coords[:, 1],
+                                    self.significance, alpha, beta, max_distance, block_size=16)
+        np.testing.assert_allclose(matrix, expected, atol=1e-4)
+
+    def test_pairs_within_max_distance(self):
+        """Test only pairs inside max_distance are reported, in row order."""
+        max_distance = 20000
+        _, pairs = self.run_blocks(self.f_coords[:, 0], self.f_coords[:, 1],
+                                   self.tc_coords[:, 0], self.tc_coords[:, 1],
+                                   self.significance, 1, 2, max_distance, block_size=7)
+        expected = [(i, j)
+                    for i, (f_lat, f_lon) in enumerate(self.f_coords)
+                    for j, (tc_lat, tc_lon) in enumerate(self.tc_coords)
+                    if reference_distance(f_lat, f_lon, tc_lat, tc_lon) <= max_distance]
+        self.assertEqual(pairs, expected)
+
+    def test_coincident_supplier_takes_row(self):
+        """Test a supplier at zero distance gets the whole probability."""
+        matrix, pairs = self.run_blocks([55.0], [37.0], [55.0, 55.01], [37.0, 37.0], [1, 100], 1, 2, 5000)
+        np.testing.assert_array_equal(matrix, [[1, 0]])
+        self.assertEqual(pairs, [(0, 0), (0, 1)])
+
+    def test_line_mask(self):
+        """Test the flow-line output modes."""
+        rows = np.array([0, 0, 0, 1, 1, 2])
+        probabilities = np.array([0.2, 0.5, 0.3, 0.0, 1.0, 0.0])
+        self.assertEqual(line_mask(rows, probabilities, 3, LINES_ALL).tolist(), [True] * 6)
+        self.assertEqual(line_mask(rows, probabilities, 3, LINES_TOP_K, top_k=2).tolist(),
+                         [False, True, True, False, True, False])
+        self.assertEqual(line_mask(rows, probabilities, 3, LINES_THRESHOLD, threshold=0.3).tolist(),
+                         [False, True, True, False, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
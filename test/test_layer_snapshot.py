@@ -0,0 +1,93 @@
+# coding=utf-8
+"""Layer snapshot test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsPointXY, QgsVectorLayer
+
+from layer_snapshot import LayerSource, add_features, snapshot_layer, write_column
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+
+class LayerSnapshotTest(unittest.TestCase):
+    """Test a point layer is read into arrays."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.layer = QgsVectorLayer('Point?crs=EPSG:4326', 'points', 'memory')
+        provider = self.layer.dataProvider()
+        provider.addAttributes([QgsField('name', QVariant.String), QgsField('population', QVariant.Int)])
+        self.layer.updateFields()
+        features = []
+        for x, y, name, population in [(37.0, 55.0, 'a', 100), (38.0, 56.0, 'b', None), (None, None, 'c', 5)]:
+            feature = QgsFeature(self.layer.fields())
+            if x is not None:
+                feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            feature.setAttributes([name, population])
+            features.append(feature)
+        provider.addFeatures(features)
+
+    def test_snapshot(self):
+        """Test ids, coordinates and the requested column."""
+        snapshot = snapshot_layer(self.layer, ['population'])
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.skipped, 1)
+        self.assertEqual(snapshot.x.tolist(), [37.0, 38.0])
+        self.assertEqual(snapshot.y.tolist(), [55.0, 56.0])
+        self.assertEqual(snapshot.column('population')[0], 100)
+        self.assertTrue(snapshot.column('population')[1] != snapshot.column('population')[1])
+
+    def test_source_in_threads(self):
+        """Test independent sources made on the main thread read in worker threads."""
+        sources = [LayerSource(self.layer) for _ in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            snapshots = list(executor.map(lambda source: snapshot_layer(source, ['population']), sources))
+        for snapshot in snapshots:
+            self.assertEqual(snapshot.x.tolist(), [37.0, 38.0])
+            self.assertEqual(snapshot.column('population')[0], 100)
+
+    def test_write_column(self):
+        """Test a column is written back for the given ids."""
+        snapshot = snapshot_layer(self.layer)
+        self.assertTrue(write_column(self.layer, 'population', snapshot.ids, [7, 8]))
+        values = {f.id(): f['population'] for f in self.layer.getFeatures()}
+        self.assertEqual([values[f_id] for f_id in snapshot.ids.tolist()], [7, 8])
+
+    def test_add_features(self):
+        """Test features are added from WKB and attribute rows."""
+        layer = QgsVectorLayer('LineString?crs=EPSG:4326', 'lines', 'memory')
+        layer.dataProvider().addAttributes([QgsField('center', QVariant.Int)])
+        layer.updateFields()
+        line = QgsGeometry.fromWkt('LineString (0 0, 1 1)')
+        added = add_features(layer, [line.asWkb(), line], [(1,), (2,)])
+        self.assertEqual(len(added), 2)
+        self.assertEqual(sorted(f['center'] for f in layer.getFeatures()), [1, 2])
+
+    def test_add_features_canceled(self):
+        """Test a canceled insert adds nothing and reports None."""
+        layer = QgsVectorLayer('LineString?crs=EPSG:4326', 'lines', 'memory')
+        layer.dataProvider().addAttributes([QgsField('center', QVariant.Int)])
+        layer.updateFields()
+        line = QgsGeometry.fromWkt('LineString (0 0, 1 1)')
+        progress = []
+        self.assertIsNone(add_features(layer, [line], [(1,)], is_canceled=lambda: True, progress=progress.append))
+        self.assertEqual(layer.featureCount(), 0)
+        self.assertEqual(progress, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
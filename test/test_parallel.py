@@ -0,0 +1,64 @@
+# coding=utf-8
+"""Execution backends test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import unittest
+
+import numpy as np
+
+from engine.centers import nearest_heavier, significance_thresholds
+from engine.gravity import gravity_blocks
+from engine.parallel import BACKEND_PROCESS, BACKEND_SERIAL, attach_array, make_backend, share_array
+
+
+class ParallelTest(unittest.TestCase):
+    """Test every backend produces the serial results."""
+
+    def test_shared_array_roundtrip(self):
+        """Test an array attached by descriptor sees the shared data."""
+        shm, descriptor = share_array(np.arange(10, dtype=float))
+        try:
+            other, array = attach_array(descriptor)
+            np.testing.assert_array_equal(array, np.arange(10))
+            del array
+            other.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_gravity_blocks(self):
+        """Test blocks come back in order with the serial probabilities."""
+        rng = np.random.default_rng(7)
+        args = (rng.uniform(55, 56, 500), rng.uniform(37, 38, 500),
+                rng.uniform(55, 56, 40), rng.uniform(37, 38, 40), rng.uniform(10, 1000, 40),
+                1.0, 2.0, 25000)
+        serial = list(gravity_blocks(*args, block_size=64, backend=make_backend(BACKEND_SERIAL)))
+        blocks = list(gravity_blocks(*args, block_size=64, backend=make_backend(BACKEND_PROCESS, workers=2)))
+        self.assertEqual([block[0] for block in blocks], [block[0] for block in serial])
+        for expected, actual in zip(serial, blocks):
+            for a, b in zip(expected[1:], actual[1:]):
+                np.testing.assert_array_equal(a, b)
+
+    def test_nearest_heavier(self):
+        """Test the chunked neighbour search matches a single chunk."""
+        rng = np.random.default_rng(5)
+        x, y, weights = rng.uniform(0, 100, 300), rng.uniform(0, 100, 300), rng.uniform(1, 1000, 300)
+        thresholds = significance_thresholds(weights, 1.3)
+        expected = nearest_heavier(x, y, weights, thresholds, chunk_size=300)
+        for kind in (BACKEND_SERIAL, BACKEND_PROCESS):
+            result = nearest_heavier(x, y, weights, thresholds, backend=make_backend(kind, workers=2), chunk_size=64)
+            np.testing.assert_array_equal(result, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
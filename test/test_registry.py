@@ -0,0 +1,72 @@
+# coding=utf-8
+"""Result registry test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import os
+import tempfile
+import unittest
+
+from engine.flow_matrix import FlowMatrix
+from engine.registry import ResultRegistry
+
+
+def make_flows():
+    return FlowMatrix.from_pairs([1, 2], [7], [0, 1], [0, 0], [1.0, 1.0])
+
+
+class ResultRegistryTest(unittest.TestCase):
+    """Test registry lookups and its rebuild from gm_data."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.directory = tempfile.mkdtemp()
+        self.registry = ResultRegistry(self.directory)
+
+    def test_register_and_lookup(self):
+        """Test a registered run is found by its consumer layer."""
+        entry = self.registry.register('consumers&1', 'suppliers', make_flows(), {'alpha': 1.0}, 'lines')
+        self.assertIs(self.registry.get('consumers&1'), entry)
+        self.assertIsNone(self.registry.get('suppliers'))
+        self.assertNotIn('&', os.path.basename(entry.path))
+        self.assertEqual(entry.flows.metadata['layer_tc'], 'suppliers')
+
+    def test_remove_layer(self):
+        """Test removing a supplier layer drops every run that used it."""
+        self.registry.register('a', 'suppliers', make_flows())
+        self.registry.register('b', 'suppliers', make_flows())
+        self.registry.register('c', 'other', make_flows())
+        removed = self.registry.remove_layer('suppliers')
+        self.assertEqual(sorted(entry.layer_id for entry in removed), ['a', 'b'])
+        self.assertEqual([entry.layer_id for entry in self.registry], ['c'])
+        self.assertEqual(self.registry.remove_layer('lines'), [])
+        self.assertEqual(len(self.registry.remove_layer('c')), 1)
+        self.assertEqual(len(self.registry), 0)
+
+    def test_scan(self):
+        """Test the registry is rebuilt from saved result headers."""
+        entry = self.registry.register('consumers', 'suppliers', make_flows(), {'beta': 2.0})
+        entry.flows.save(entry.path)
+        with open(os.path.join(self.directory, 'junk.gmb'), 'wb') as file:
+            file.write(b'junk')
+
+        registry = ResultRegistry(self.directory)
+        registry.scan()
+        self.assertEqual(len(registry), 1)
+        restored = registry.get('consumers')
+        self.assertEqual(restored.layer_tc_id, 'suppliers')
+        self.assertEqual(restored.parameters, {'beta': 2.0})
+        self.assertIsNone(restored.flows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+# coding=utf-8
+"""KD-tree test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import unittest
+
+import numpy as np
+
+from engine.spatial_index import KDTree
+
+
+class KDTreeTest(unittest.TestCase):
+    """Test KD-tree queries against brute force."""
+
+    def setUp(self):
+        """Runs before each test."""
+        rng = np.random.default_rng(7)
+        self.points = rng.uniform(0, 100, (500, 2))
+        self.tree = KDTree(self.points, leaf_size=8)
+
+    def test_query_radius(self):
+        """Test radius query returns exactly the points inside the radius."""
+        for point in [(50, 50), (0, 0), (100, 3), (-20, -20)]:
+            distance = np.hypot(*(self.points - point).T)
+            expected = np.flatnonzero(distance <= 12)
+            self.assertEqual(sorted(self.tree.query_radius(point, 12).tolist()), expected.tolist())
+
+    def test_query_radius_many(self):
+        """Test batched radius query pairs every query point with its neighbours."""
+        queries = self.points[:20]
+        rows, cols = self.tree.query_radius_many(queries, 5)
+        for i, query in enumerate(queries):
+            expected = np.flatnonzero(np.hypot(*(self.points - query).T) <= 5)
+            self.assertEqual(sorted(cols[rows == i].tolist()), expected.tolist())
+
+    def test_nearest_heavier(self):
+        """Test the nearest point above a weight threshold matches brute force."""
+        weights = np.random.default_rng(3).uniform(0, 100, len(self.points))
+        tree = KDTree(self.points, leaf_size=8, weights=weights)
+        for point, threshold in [((50, 50), 10), ((0, 0), 90), ((100, 3), 99), ((30, 70), 0)]:
+            candidates = np.flatnonzero(weights > threshold)
+            distance = np.hypot(*(self.points[candidates] - point).T)
+            self.assertEqual(tree.nearest_heavier(point, threshold), candidates[np.argmin(distance)])
+        self.assertEqual(tree.nearest_heavier((50, 50), 100), -1)
+
+    def test_query_knn_all(self):
+        """Test the all-points search matches a brute-force search without the point itself."""
+        result = self.tree.query_knn_all(5)
+        for i, point in enumerate(self.points):
+            distance = ((self.points - point) ** 2).sum(axis=1)
+            distance[i] = np.inf
+            self.assertEqual(result[i].tolist(), np.argsort(distance, kind='stable')[:5].tolist())
+        self.assertEqual(KDTree(self.points[:3]).query_knn_all(5).shape, (3, 2))
+
+    def test_empty_and_duplicates(self):
+        """Test an empty tree and a tree of identical points."""
+        self.assertEqual(len(KDTree(np.empty((0, 2))).query_radius((0, 0), 1)), 0)
+        tree = KDTree(np.ones((100, 2)), leaf_size=4)
+        self.assertEqual(len(tree.query_radius((1, 1), 0)), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
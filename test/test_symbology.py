@@ -0,0 +1,45 @@
+# coding=utf-8
+"""Result symbology test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'dvornikov_alesha@mail.ru'
+__date__ = '2024-03-01'
+__copyright__ = 'Copyright 2024, LightModels'
+
+import unittest
+
+from qgis.core import QgsExpression, QgsExpressionContext, QgsExpressionContextScope, QgsSingleSymbolRenderer, QgsVectorLayer
+
+from symbology import PALETTE, palette_expression, palette_renderer
+from .utilities import get_qgis_app
+QGIS_APP = get_qgis_app()
+
+
+class SymbologyTest(unittest.TestCase):
+    """Test the palette renderer."""
+
+    def test_palette_expression(self):
+        """Test the expression picks the palette colour by index, wrapping around."""
+        for index, expected in [(0, PALETTE[0]), (3, PALETTE[3]), (len(PALETTE) + 1, PALETTE[1])]:
+            scope = QgsExpressionContextScope()
+            scope.setVariable('palette', index)
+            context = QgsExpressionContext()
+            context.appendScope(scope)
+            expression = QgsExpression(palette_expression('palette').replace('"palette"', '@palette'))
+            self.assertEqual(expression.evaluate(context), expected)
+
+    def test_palette_renderer(self):
+        """Test one symbol is used for every geometry type."""
+        for uri in ('Point', 'LineString', 'Polygon'):
+            layer = QgsVectorLayer(uri + '?crs=EPSG:4326', 'layer', 'memory')
+            self.assertIsInstance(palette_renderer(layer, 'palette'), QgsSingleSymbolRenderer)
+
+
+if __name__ == "__main__":
+    unittest.main()